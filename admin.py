@@ -0,0 +1,122 @@
+import math
+import os
+from functools import wraps
+from flask import Blueprint,render_template,url_for,redirect,flash,abort,jsonify,current_app,request
+from flask_login import current_user
+from moderation import moderate,ACTIONS,MAX_BULK_USERS
+from forms import BulkModerationForm
+from user_cache import user_cache
+from fragments import fragment_cache
+from dashboard import user_filters,user_page,site_totals,SORTS,USERS_PER_PAGE
+
+
+bp = Blueprint("admin", __name__)
+
+
+def admin_only (fun):
+    @wraps(fun)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return abort(403)
+        elif not current_user.admin_privileges:
+            return abort(403)
+        return fun(*args, **kwargs)
+    return wrapper
+
+def super_admin_only(fun):
+    @wraps(fun)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated or not current_user.is_super_admin:
+            abort(403)
+        return fun(*args, **kwargs)
+    return wrapper
+
+
+@bp.route("/admin_dashboard")
+@admin_only
+def admin_dashboard():
+    if current_user.is_restricted:
+        flash("You have been temporarily restricted from accessing the admin_dashboard.")
+        return redirect(url_for('blog.home'))
+    filters = {"role": request.args.get("role",""), "restricted": request.args.get("restricted",""),
+               "q": request.args.get("q","").strip()}
+    sort = request.args.get("sort","id")
+    if sort not in SORTS:
+        sort = "id"
+    order = "desc" if request.args.get("order") == "desc" else "asc"
+    page = max(request.args.get("page",1,type=int),1)
+    rows, found = user_page(user_filters(filters["role"], filters["restricted"], filters["q"]), sort, order == "desc", page)
+    pages = max(math.ceil(found / USERS_PER_PAGE), 1)
+    return render_template("admin_dash.html",rows=rows,found=found,page=page,pages=pages,
+                           params=dict(filters, sort=sort, order=order),totals=site_totals(),
+                           bulk_form=BulkModerationForm())
+
+
+@bp.route("/admin_cache_stats")
+@admin_only
+def admin_cache_stats():
+    # Per-process counters: each worker reports its own caches
+    return jsonify(pid=os.getpid(), users=user_cache().stats, fragments=fragment_cache().stats)
+
+
+@bp.route("/admin_dashboard/queries")
+@admin_only
+def admin_query_stats():
+    # Per-process like the cache stats; empty until SQL_SAMPLE_RATE is set
+    stats = current_app.extensions.get("query_stats")
+    return render_template("admin_queries.html", stats=stats, routes=stats.summary() if stats else [], pid=os.getpid())
+
+
+def moderate_one(action, user_id):
+    outcome, = moderate(action, [user_id], current_user)
+    if outcome["status"] == "missing":
+        abort(404)
+    if outcome["status"] == "refused":
+        flash(outcome["reason"])
+    return redirect(url_for("admin.admin_dashboard"))
+
+
+@bp.route("/promote/<int:user_id>")
+@super_admin_only
+def promote(user_id):
+    return moderate_one("promote", user_id)
+
+
+@bp.route("/demote/<int:user_id>")
+@super_admin_only
+def demote(user_id):
+    return moderate_one("demote", user_id)
+
+
+@bp.route("/remove_user/<int:user_id>")
+@admin_only
+def remove_user(user_id):
+    return moderate_one("remove", user_id)
+
+
+@bp.route("/restrict_user/<int:user_id>")
+@admin_only
+def restrict_user(user_id):
+    return moderate_one("restrict", user_id)
+
+
+@bp.route("/unrestrict_user/<int:user_id>")
+@admin_only
+def unrestrict_user(user_id):
+    return moderate_one("unrestrict", user_id)
+
+
+@bp.route("/admin_dashboard/bulk",methods=["POST"])
+@admin_only
+def bulk_moderation():
+    form = BulkModerationForm()
+    user_ids = request.form.getlist("user_ids",type=int)
+    if not form.validate_on_submit() or not user_ids or len(user_ids) > MAX_BULK_USERS:
+        flash(f"Pick an action and between 1 and {MAX_BULK_USERS} users.")
+        return redirect(request.referrer or url_for("admin.admin_dashboard"))
+    if ACTIONS[form.action.data]["super_admin_only"] and not current_user.is_super_admin:
+        abort(403)
+    report = moderate(form.action.data, user_ids, current_user)
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return jsonify(action=form.action.data, report=report)
+    return render_template("admin_moderation_report.html",action=form.action.data,report=report)
@@ -0,0 +1,244 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from flask import current_app, request, send_file, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Built files live in static/dist under content-hashed names, so they can be cached forever
+DIST = "dist"
+MANIFEST = "manifest.json"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE = {".css", ".js", ".svg", ".ico", ".json", ".txt"}
+# Classes the Bootstrap bundle (loaded from the CDN) toggles at runtime; no template spells them out
+SAFELIST = {"show", "showing", "hiding", "collapse", "collapsing", "collapsed", "fade", "active", "disabled",
+            "modal-open", "modal-backdrop", "modal-static", "offcanvas-backdrop", "dropdown-menu-end",
+            "dropdown-menu-start", "dropup", "dropend", "dropstart", "was-validated", "is-valid", "is-invalid",
+            "navbar-shrink", "tooltip", "popover", "toast", "visually-hidden"}
+SAFE_PREFIXES = ("bs-", "tooltip-", "popover-", "carousel-item-")
+
+TOKEN = re.compile(r"[A-Za-z0-9_-]+")
+COMMENT_OR_STRING = re.compile(r"/\*.*?\*/|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'", re.S)
+PLACEHOLDER = re.compile(r"\x00(\d+)\x00")
+DELIMITER = re.compile(r"[{};]")
+NESTED = re.compile(r"@(media|supports|container|layer|document)\b")
+NAMES = re.compile(r"[.#](-?[_a-zA-Z][\w-]*)")
+NEGATION = re.compile(r":not\([^)]*\)")
+
+
+def content_tokens(sources):
+    # Every word in the templates, scripts and views counts as a possible class or id. A token
+    # ending in "-" comes from markup like alert-{{ category }} and keeps the whole family.
+    words = set(SAFELIST)
+    for text in sources:
+        words.update(TOKEN.findall(text))
+    prefixes = SAFE_PREFIXES + tuple(word for word in words if word.endswith("-"))
+    return words, prefixes
+
+
+def protect(css):
+    # Drop comments and park string literals, so braces and semicolons inside data URIs can't confuse the parser
+    strings = []
+
+    def park(match):
+        text = match.group()
+        if text.startswith("/*"):
+            return ""
+        strings.append(text)
+        return f"\x00{len(strings) - 1}\x00"
+    return COMMENT_OR_STRING.sub(park, css), strings
+
+
+def closing_brace(css, start):
+    depth = 0
+    for i in range(start, len(css)):
+        if css[i] == "{":
+            depth += 1
+        elif css[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(css)
+
+
+def parse(css):
+    # [(prelude, body)]: body is a declaration string, a nested rule list (@media and
+    # friends) or None for statements such as @import
+    rules, pos = [], 0
+    while True:
+        match = DELIMITER.search(css, pos)
+        if match is None:
+            return rules
+        prelude = css[pos:match.start()].strip()
+        if match.group() != "{":
+            if prelude:
+                rules.append((prelude, None))
+            pos = match.end()
+            continue
+        end = closing_brace(css, match.start())
+        body = css[match.end():end]
+        rules.append((prelude, parse(body) if NESTED.match(prelude) else body))
+        pos = end + 1
+
+
+def split_selectors(prelude):
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(prelude[start:i])
+            start = i + 1
+    parts.append(prelude[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def purge(rules, words, prefixes):
+    def used(selector):
+        if "\\" in selector:
+            return True
+        return all(name in words or name.startswith(prefixes) for name in NAMES.findall(NEGATION.sub("", selector)))
+
+    kept = []
+    for prelude, body in rules:
+        if isinstance(body, list):
+            body = purge(body, words, prefixes)
+            if body:
+                kept.append((prelude, body))
+        elif body is None or prelude.startswith("@"):
+            kept.append((prelude, body))
+        else:
+            selectors = [selector for selector in split_selectors(prelude) if used(selector)]
+            if selectors:
+                kept.append((",".join(selectors), body))
+    return kept
+
+
+def minify_prelude(prelude):
+    prelude = " ".join(prelude.split())
+    if prelude.startswith("@"):
+        return re.sub(r"\s*:\s*", ":", prelude)
+    return re.sub(r"\s*([,>~+])\s*", r"\1", prelude)
+
+
+def minify_body(body):
+    body = re.sub(r"\s*([;{}:,])\s*", r"\1", " ".join(body.split()))
+    return re.sub(r";+(?=}|$)", "", body)
+
+
+def serialize(rules):
+    parts = []
+    for prelude, body in rules:
+        if body is None:
+            parts.append(minify_prelude(prelude) + ";")
+        elif isinstance(body, list):
+            parts.append(f"{minify_prelude(prelude)}{{{serialize(body)}}}")
+        else:
+            body = minify_body(body)
+            if body:
+                parts.append(f"{minify_prelude(prelude)}{{{body}}}")
+    return "".join(parts)
+
+
+def build_css(css, words, prefixes):
+    css, strings = protect(css)
+    css = serialize(purge(parse(css), words, prefixes))
+    return PLACEHOLDER.sub(lambda match: strings[int(match.group(1))], css)
+
+
+def write_compressed(path, data):
+    # Precompressed siblings are only kept when they actually save bytes
+    sizes = {}
+    packed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(packed) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(packed)
+        sizes["gzip"] = len(packed)
+    if brotli is not None:
+        packed = brotli.compress(data, quality=11)
+        if len(packed) < len(data):
+            with open(path + ".br", "wb") as f:
+                f.write(packed)
+            sizes["br"] = len(packed)
+    return sizes
+
+
+def build(static_folder, sources):
+    # Rebuilds static/dist from scratch and yields (source, built name, size before, size after, compressed sizes)
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    words, prefixes = content_tokens(sources)
+    manifest = {}
+    for folder, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(name for name in dirs if os.path.join(folder, name) != dist)
+        for name in sorted(files):
+            source = os.path.join(folder, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            stem, extension = os.path.splitext(relative)
+            if extension == ".css":
+                output = build_css(data.decode("utf-8"), words, prefixes).encode("utf-8")
+            else:
+                output = data
+            built = f"{stem}.{hashlib.sha256(output).hexdigest()[:12]}{extension}"
+            target = os.path.join(dist, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(output)
+            compressed = write_compressed(target, output) if extension in COMPRESSIBLE else {}
+            manifest[relative] = built
+            yield relative, built, len(data), len(output), compressed
+    with open(os.path.join(dist, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def manifest():
+    extension = current_app.extensions
+    if "asset_manifest" not in extension:
+        path = os.path.join(current_app.static_folder, DIST, MANIFEST)
+        try:
+            with open(path) as f:
+                extension["asset_manifest"] = json.load(f)
+        except FileNotFoundError:
+            # No build yet (development): url_for keeps pointing at the source files
+            extension["asset_manifest"] = {}
+    return extension["asset_manifest"]
+
+
+def fingerprint_static_urls(endpoint, values):
+    # url_for("static", filename="css/styles.css") -> /static/dist/css/styles.<hash>.css once built
+    if endpoint == "static" and "filename" in values:
+        built = manifest().get(values["filename"])
+        if built is not None:
+            values["filename"] = f"{DIST}/{built}"
+
+
+def send_asset(filename):
+    path = safe_join(os.path.join(current_app.static_folder, DIST), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    for name, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, name
+            break
+    response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if encoding is not None:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
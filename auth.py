@@ -0,0 +1,197 @@
+import random
+from datetime import datetime,timedelta
+from flask import Blueprint,render_template,request,url_for,redirect,flash,session,current_app
+from flask_login import LoginManager,login_user,logout_user
+from werkzeug.security import generate_password_hash,check_password_hash
+from database import db
+from forms import RegisterForm,LoginForm,EmailVerify,PassReset
+from models import User
+from inbox import create_notifications
+from mailer import email_notification
+from user_cache import user_cache
+
+
+bp = Blueprint("auth", __name__)
+login_manager = LoginManager()
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    user = user_cache().load(int(user_id))
+    # An account pending deletion is signed out everywhere as soon as it is marked
+    return None if user is None or user.pending_deletion else user
+
+@login_manager.unauthorized_handler
+def unauthorized():
+    flash("You need to login/register first.")
+    return redirect(url_for("auth.login"))
+
+@bp.route('/register',methods=['GET','POST'])
+def register():
+    form = RegisterForm()
+    if form.validate_on_submit():
+        email =form.email.data
+        user = User.query.filter_by(email=email).first()
+        if user:
+            flash('Email already registered, login instead.')
+            return redirect(url_for('auth.login'))
+        password_hash = generate_password_hash(form.password.data,method='pbkdf2:sha256',salt_length=8)
+        new_user = User(email=form.email.data,
+                        password = password_hash,
+                        name=form.name.data,
+                        )
+        db.session.add(new_user)
+        db.session.commit()
+        login_user(new_user)
+        create_notifications(
+            "Welcome",
+            f"Hello {new_user.name},\n\nWelcome to our platform! We're excited to have you on board. Explore the site, engage with posts, and enjoy your experience.\n\nBest regards,\nThe Team",
+            receiver_id=new_user.id,
+            sender_id=1,
+        )
+        db.session.commit()
+        return redirect(url_for('blog.home'))
+    return render_template("register.html",form=form)
+
+@bp.route('/login',methods=['GET','POST'])
+def login():
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        if not user:
+            flash("Email doesn't exist, please register first.")
+            return redirect(url_for('auth.login'))
+        elif user.pending_deletion:
+            flash("This account is being deleted.")
+            return redirect(url_for('auth.login'))
+        elif not check_password_hash(user.password,form.password.data):
+            flash("Password doesn't match")
+            return redirect(url_for('auth.login'))
+        else:
+            login_user(user)
+            return redirect(url_for('blog.home'))
+    return render_template("login.html",form=form)
+
+
+@bp.route('/logout')
+def logout():
+    logout_user()
+    return redirect(url_for('blog.home'))
+
+
+@bp.route("/forget_password",methods=["GET","POST"])
+def forget_password():
+    reset_pass = EmailVerify()
+    if reset_pass.validate_on_submit():
+        user = User.query.filter_by(email=reset_pass.email_address.data).first()
+        if user:
+            verification_code = random.randint(10000, 99999)
+
+            session.permanent = True  # ensures we can use permanent_session_lifetime
+            current_app.permanent_session_lifetime = timedelta(minutes=3)
+
+            session['password_reset_code'] = verification_code
+            session['password_reset_user'] = user.id
+            session['password_reset_time'] = datetime.utcnow().timestamp()
+
+            subject = "Password Reset Request"
+            body = (
+                f"Hello {user.name},\n\n"
+                f"You requested to reset your password. "
+                f"Please use the following verification code to proceed:\n\n"
+                f"Verification Code: {verification_code}\n\n"
+                f"This code is valid for 3 minutes.\n\n"
+                "If you did not request a password reset, please ignore this email.\n\n"
+                "Best regards,\n"
+                "The Team"
+            )
+            email_notification(user.email, subject, body)
+
+            return redirect(url_for('auth.verify'))
+
+        else:
+            flash("No account found with that email.", "warning")
+
+    return render_template("forget_password.html", reset_pass=reset_pass)
+
+
+@bp.route("/verification",methods=["GET","POST"])
+def verify():
+    if request.method == "POST":
+        # Get digits from form and join them
+        code_entered = "".join([
+            request.form.get("digit1", ""),
+            request.form.get("digit2", ""),
+            request.form.get("digit3", ""),
+            request.form.get("digit4", ""),
+            request.form.get("digit5", "")
+        ])
+
+        # Get stored code and timestamp
+        verification_code = str(session.get("password_reset_code"))
+        code_time = session.get("password_reset_time")
+        current_time = datetime.utcnow().timestamp()
+
+        # Check if code exists
+        if not verification_code or not code_time:
+            flash("No verification code found. Please request a new one.", "danger")
+            return redirect(url_for("auth.forget_password"))
+
+        # Check if code expired (3 minutes)
+        if current_time - code_time > 180:
+            flash("Verification code expired. Please request a new one.", "warning")
+            session.pop("password_reset_code", None)
+            session.pop("password_reset_time", None)
+            return redirect(url_for("auth.forget_password"))
+
+        # Check if code matches
+        if code_entered == verification_code:
+            return redirect(url_for("auth.reset_password"))
+        else:
+            flash("Incorrect code. Please try again.", "danger")
+            return redirect(url_for("auth.verify"))
+    return render_template("verify_reset.html")
+
+
+@bp.route("/password_reset",methods=["GET","POST"])
+def reset_password():
+    reset_password = PassReset()
+    user_id = session.get("password_reset_user")
+    if not user_id:
+        flash("Session expired please try again.")
+        return redirect(url_for("auth.forget_password"))
+    user = User.query.filter_by(id=user_id).first()
+    receiver = user.email
+    sub = "Your Password Has Been Reset Successfully"
+    msg = f"""Hello {user.name},
+
+Your password has been successfully reset. You can now log in to your account using your new password.
+
+If you did not perform this action, please contact our support team immediately.
+
+Thank you for keeping your account secure.
+
+Best regards,
+The Team
+"""
+    if reset_password.validate_on_submit():
+        if user:
+            password_hash = generate_password_hash(reset_password.confirm_password.data, method='pbkdf2:sha256', salt_length=8)
+            user.password = password_hash
+            create_notifications(
+                "Password Reset Successful",
+                f"Hello {user.name}, your password has been successfully reset. You can now log in and access all features.",
+                receiver_id=user.id,
+                sender_id=1,
+                is_admin_message=True
+            )
+            db.session.commit()
+            email_notification(receiver, sub, msg)
+            session.pop("password_reset_user", None)
+            session.pop("password_reset_code", None)
+            session.pop("password_reset_time", None)
+            flash("Your password has been reset successfully!", "success")
+            return redirect(url_for("auth.login"))
+        else:
+            flash("User not found.", "danger")
+    return render_template("reset_password.html",reset_pass=reset_password)
@@ -0,0 +1,21 @@
+import hashlib
+from functools import lru_cache
+
+
+# Same link the Flask-Gravatar filter used to build (retro default, G rating, plain http)
+AVATAR_URL = "http://www.gravatar.com/avatar/{hash}?s={size}&d=retro&r=g"
+
+
+def email_hash(email):
+    # Gravatar looks addresses up by the md5 of their trimmed, lowercased form
+    return hashlib.md5(email.strip().lower().encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=20000)
+def avatar_link(hash, size):
+    return AVATAR_URL.format(hash=hash, size=size)
+
+
+def avatar_url(user, size=100):
+    # The hash changes with the email, so a stale link can never be served for a user
+    return avatar_link(user.email_hash or email_hash(user.email), size)
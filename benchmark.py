@@ -0,0 +1,261 @@
+import os
+import random
+import smtplib
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, func
+from werkzeug.security import generate_password_hash
+from database import db
+from models import User, BlogPost, Comments, Likes, Notifications, OutboxEmail
+from avatars import email_hash
+from counters import repair_counters, repair_unread_counts
+from search import rebuild_index
+from profiling import count_queries
+
+
+SIZES = {"users": 200, "posts": 1000, "comments": 5000, "likes": 20000, "notifications": 10000}
+PASSWORD = "benchmark"
+AJAX = {"X-Requested-With": "XMLHttpRequest"}
+# Endpoints no scenario drives, and why
+SKIPPED = {"static": "plain file serving", "dist_asset": "needs a built static/dist",
+           "bootstrap.static": "plain file serving", "ckeditor.static": "plain file serving"}
+
+
+def skewed(rng, population, count, skew):
+    # Zipf-like picks: a few ids (hot posts, heavy likers) get most of the traffic
+    weights = [1 / (rank + 1) ** skew for rank in range(len(population))]
+    return rng.choices(population, weights=weights, k=count)
+
+
+def bulk_insert(model, rows, batch=5000):
+    for start in range(0, len(rows), batch):
+        db.session.execute(insert(model), rows[start:start + batch])
+
+
+def seed_database(sizes, seed=1, reserve=0, skew=1.1):
+    # Fills an empty schema and returns the ids the scenarios act on. `reserve` extra posts,
+    # comments and users belong to the benchmark viewer so destructive routes get a fresh
+    # target on every iteration.
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password = generate_password_hash(PASSWORD, method="pbkdf2:sha256", salt_length=8)
+    users = sizes["users"] + reserve
+    bulk_insert(User, [{"id": i, "email": f"bench{i}@example.com", "email_hash": email_hash(f"bench{i}@example.com"),
+                        "password": password, "name": f"Bench User {i}", "is_admin": i == 1, "is_restricted": False}
+                       for i in range(1, users + 1)])
+    user_ids = list(range(1, sizes["users"] + 1))
+    victims = list(range(sizes["users"] + 1, users + 1))
+    # Prolific authors and heavy likers come from the same skewed ranking
+    viewer = 2
+    posts = sizes["posts"] + reserve
+    authors = skewed(rng, user_ids, sizes["posts"], skew) + [viewer] * reserve
+    post_rows = []
+    for i, author_id in enumerate(authors, 1):
+        created = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        post_rows.append({"id": i, "author_id": author_id, "title": f"Benchmark post {i} about topic {i % 97}",
+                          "subtitle": f"Subtitle {i}", "img_url": "https://example.invalid/img.png",
+                          "body": "<p>" + " ".join(f"word{rng.randint(0, 500)}" for _ in range(rng.randint(50, 400))) + "</p>",
+                          "created_at": created, "updated_at": created})
+    bulk_insert(BlogPost, post_rows)
+    post_ids = list(range(1, sizes["posts"] + 1))
+    spare_posts = list(range(sizes["posts"] + 1, posts + 1))
+
+    comment_posts = skewed(rng, post_ids, sizes["comments"], skew)
+    bulk_insert(Comments, [{"id": i, "post_id": post_id, "author_id": rng.choice(user_ids), "text": f"Comment {i}",
+                            "date": now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))}
+                           for i, post_id in enumerate(comment_posts, 1)])
+    # Spare comments by the viewer, on the post that tops the skew
+    spare_comments = list(range(sizes["comments"] + 1, sizes["comments"] + reserve + 1))
+    bulk_insert(Comments, [{"id": i, "post_id": post_ids[0], "author_id": viewer, "text": f"Spare comment {i}", "date": now}
+                           for i in spare_comments])
+
+    likes, likers = set(), skewed(rng, user_ids, sizes["likes"], skew)
+    for author_id, post_id in zip(likers, skewed(rng, post_ids, sizes["likes"], skew)):
+        likes.add((author_id, post_id))
+    bulk_insert(Likes, [{"author_id": author_id, "post_id": post_id} for author_id, post_id in likes])
+
+    post_authors = dict(enumerate(authors, 1))
+    notification_posts = skewed(rng, post_ids, sizes["notifications"], skew)
+    bulk_insert(Notifications, [{"type": "Like", "message": f"Someone liked your post {post_id}.", "post_id": post_id,
+                                 "receiver_id": post_authors[post_id], "sender_id": rng.choice(user_ids),
+                                 "is_read": rng.random() < 0.7, "timestamp": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))}
+                                for post_id in notification_posts])
+    db.session.flush()
+    repair_counters()
+    repair_unread_counts()
+    rebuild_index()
+    db.session.commit()
+    hot_post = db.session.scalar(select(BlogPost.id).order_by(BlogPost.like_count.desc()).limit(1))
+    return {"viewer": viewer, "admin": 1, "hot_post": hot_post, "posts": post_ids, "users": user_ids,
+            "spare_posts": spare_posts, "spare_comments": spare_comments, "victims": victims,
+            "hot_comment": db.session.scalar(select(Comments.id).where(Comments.post_id == hot_post).limit(1)),
+            "profile": max(set(authors[:sizes["posts"]]), key=authors.count)}
+
+
+@contextmanager
+def offline_smtp():
+    # Mail is only queued in the outbox during requests; anything that tries to reach a real
+    # server anyway is counted here instead of touching the network
+    attempts = []
+
+    class StubSMTP:
+        def __init__(self, *args, **kwargs):
+            attempts.append(args)
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: (250, b"ok")
+
+    original = smtplib.SMTP, smtplib.SMTP_SSL
+    smtplib.SMTP = smtplib.SMTP_SSL = StubSMTP
+    try:
+        yield attempts
+    finally:
+        smtplib.SMTP, smtplib.SMTP_SSL = original
+
+
+def stream_first_event(client, data, i):
+    # The SSE stream never ends; time it until the replay is done and the unread count arrives
+    response = client.get("/notifications/stream", buffered=False)
+    for chunk in response.response:
+        if b"event: unread" in chunk:
+            break
+    response.close()
+    return response
+
+
+def reset_session(client, data, i):
+    with client.session_transaction() as sess:
+        sess["password_reset_user"] = data["victims"][-1]
+        sess["password_reset_code"] = 12345
+        sess["password_reset_time"] = datetime.utcnow().timestamp()
+
+
+def fresh_post(i):
+    return {"title": f"Benchmark new post {i} {time.time_ns()}", "subtitle": "s", "img": "https://example.invalid/a.png",
+            "body": "<p>benchmark</p>"}
+
+
+# (name, endpoint, viewer, send, prepare): send(client, data, i) issues the timed request, prepare runs
+# untimed before it. Iteration i of a destructive scenario works on its own spare row.
+SCENARIOS = [
+    ("home", "blog.home", "viewer", lambda c, d, i: c.get("/"), None),
+    ("home anonymous", "blog.home", None, lambda c, d, i: c.get("/"), None),
+    ("load_posts", "blog.load_posts", "viewer", lambda c, d, i: c.get(f"/load_posts?offset={5 * (i + 1)}&limit=5"), None),
+    ("about", "blog.about", "viewer", lambda c, d, i: c.get("/about"), None),
+    ("contact", "blog.contact", "viewer", lambda c, d, i: c.get("/contact"), None),
+    ("contact submit", "blog.contact", "viewer",
+     lambda c, d, i: c.post("/contact", data={"username": "b", "email": "b@example.com", "phone": "1", "message": "hi"}), None),
+    ("post_page hot", "blog.post_page", "viewer", lambda c, d, i: c.get(f"/post/{d['hot_post']}"), None),
+    ("post_page", "blog.post_page", "viewer", lambda c, d, i: c.get(f"/post/{d['posts'][-1 - i]}"), None),
+    ("comment", "blog.post_page", "viewer", lambda c, d, i: c.post(f"/post/{d['posts'][i]}", data={"comment": f"bench {i}"}, headers=AJAX), None),
+    ("my_posts", "blog.my_posts", "viewer", lambda c, d, i: c.get(f"/my_posts/{d['profile']}"), None),
+    ("search", "blog.search", "viewer", lambda c, d, i: c.get(f"/search?q=topic {i % 97}"), None),
+    ("search empty", "blog.search", "viewer", lambda c, d, i: c.get(f"/search?page={i + 1}"), None),
+    ("post_like", "blog.post_like", "viewer", lambda c, d, i: c.post(f"/post_like/{d['hot_post']}", headers=AJAX), None),
+    ("like_comment", "blog.like_comment", "viewer", lambda c, d, i: c.post(f"/like_comment/{d['hot_comment']}", headers=AJAX), None),
+    ("new_post form", "blog.new_post", "viewer", lambda c, d, i: c.get("/new_post"), None),
+    ("new_post", "blog.new_post", "viewer", lambda c, d, i: c.post("/new_post", data=fresh_post(i)), None),
+    ("edit_post form", "blog.edit_post", "viewer", lambda c, d, i: c.get(f"/edit/{d['spare_posts'][0]}"), None),
+    ("edit_post", "blog.edit_post", "viewer", lambda c, d, i: c.post(f"/edit/{d['spare_posts'][0]}", data=fresh_post(i)), None),
+    ("edit_comment form", "blog.edit_comment", "viewer", lambda c, d, i: c.get(f"/edit_comment/{d['spare_comments'][0]}"), None),
+    ("edit_comment", "blog.edit_comment", "viewer",
+     lambda c, d, i: c.post(f"/edit_comment/{d['spare_comments'][0]}", data={"comment": f"edited {i}"}), None),
+    ("notifications", "notifications.notifications", "profile", lambda c, d, i: c.get("/notifications"), None),
+    ("older_notifications", "notifications.older_notifications", "profile",
+     lambda c, d, i: c.get(f"/notifications/older?before={(datetime.utcnow() - timedelta(days=10)).isoformat()}_0"), None),
+    ("notification_stream", "notifications.notification_stream", "profile", stream_first_event, None),
+    ("register form", "auth.register", None, lambda c, d, i: c.get("/register"), None),
+    ("register", "auth.register", None,
+     lambda c, d, i: c.post("/register", data={"email": f"new{i}-{time.time_ns()}@example.com", "password": PASSWORD, "name": "New", "agree": "y"}), None),
+    ("login form", "auth.login", None, lambda c, d, i: c.get("/login"), None),
+    ("login", "auth.login", None, lambda c, d, i: c.post("/login", data={"email": "bench2@example.com", "password": PASSWORD}), None),
+    ("logout", "auth.logout", "viewer", lambda c, d, i: c.get("/logout"), None),
+    ("forget_password", "auth.forget_password", None,
+     lambda c, d, i: c.post("/forget_password", data={"email_address": "bench3@example.com"}), None),
+    ("verify", "auth.verify", None, lambda c, d, i: c.get("/verification"), None),
+    ("reset_password", "auth.reset_password", None, lambda c, d, i: c.get("/password_reset"), reset_session),
+    ("admin_dashboard", "admin.admin_dashboard", "admin", lambda c, d, i: c.get("/admin_dashboard"), None),
+    ("admin_dashboard sorted", "admin.admin_dashboard", "admin",
+     lambda c, d, i: c.get(f"/admin_dashboard?sort=likes&order=desc&q=Bench&page={i % 3 + 1}"), None),
+    ("admin_cache_stats", "admin.admin_cache_stats", "admin", lambda c, d, i: c.get("/admin_cache_stats"), None),
+    ("admin_query_stats", "admin.admin_query_stats", "admin", lambda c, d, i: c.get("/admin_dashboard/queries"), None),
+    # Each iteration moderates a different user, so none of them is a no-op
+    ("promote", "admin.promote", "admin", lambda c, d, i: c.get(f"/promote/{d['users'][-1 - i]}"), None),
+    ("demote", "admin.demote", "admin", lambda c, d, i: c.get(f"/demote/{d['users'][-1 - i]}"), None),
+    ("restrict_user", "admin.restrict_user", "admin", lambda c, d, i: c.get(f"/restrict_user/{d['users'][-1 - i]}"), None),
+    ("unrestrict_user", "admin.unrestrict_user", "admin", lambda c, d, i: c.get(f"/unrestrict_user/{d['users'][-1 - i]}"), None),
+    ("bulk_moderation", "admin.bulk_moderation", "admin",
+     lambda c, d, i: c.post("/admin_dashboard/bulk", data={"action": ("restrict", "unrestrict")[i % 2], "user_ids": d["users"][-50:]},
+                            headers=AJAX), None),
+    # Destructive ones last, so earlier scenarios see the full data set
+    ("delete_comment", "blog.delete_comment", "viewer", lambda c, d, i: c.get(f"/delete_comment/{d['spare_comments'][i + 1]}"), None),
+    ("delete_post", "blog.delete_post", "viewer", lambda c, d, i: c.get(f"/delete/{d['spare_posts'][i + 1]}"), None),
+    ("remove_user", "admin.remove_user", "admin", lambda c, d, i: c.get(f"/remove_user/{d['victims'][i]}"), None),
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def run_scenarios(app, data, iterations, warmup):
+    # Yields (name, result). Each scenario gets its own client, so logins, logouts and
+    # password-reset sessions never leak between them.
+    with app.app_context():
+        engine = db.engine
+    for name, endpoint, viewer, send, prepare in SCENARIOS:
+        client = app.test_client()
+        if viewer is not None:
+            with client.session_transaction() as sess:
+                sess["_user_id"] = str(data[viewer])
+        timings, queries, statuses = [], [], set()
+        for i in range(warmup + iterations + 1):
+            if prepare is not None:
+                prepare(client, data, i)
+            traced = i == warmup + iterations
+            if traced:
+                # One extra run under tracemalloc, which would distort the timings above
+                tracemalloc.start()
+            with count_queries(engine) as statements:
+                started = time.perf_counter()
+                response = send(client, data, i)
+                elapsed = time.perf_counter() - started
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            elif i >= warmup:
+                timings.append(elapsed)
+                queries.append(len(statements))
+            statuses.add(response.status_code)
+        yield name, {"endpoint": endpoint, "p50_ms": round(statistics.median(timings) * 1000, 2),
+                     "p95_ms": round(percentile(timings, 0.95) * 1000, 2), "mean_ms": round(statistics.fmean(timings) * 1000, 2),
+                     "queries": statistics.median(queries), "max_queries": max(queries),
+                     "peak_kib": round(peak / 1024, 1), "status": sorted(statuses)}
+
+
+def uncovered_endpoints(app):
+    covered = {endpoint for _, endpoint, _, _, _ in SCENARIOS} | set(SKIPPED)
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules()} - covered)
+
+
+def run(app, sizes, iterations=20, warmup=2, seed=1):
+    # The contact form mails EMAIL_USER, which a development .env may not set
+    os.environ.setdefault("EMAIL_USER", "benchmark@example.com")
+    with offline_smtp() as smtp_attempts:
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            data = seed_database(sizes, seed, reserve=warmup + iterations + 2)
+            seeded = time.perf_counter() - started
+            counts = {model.__tablename__: db.session.scalar(select(func.count()).select_from(model))
+                      for model in (User, BlogPost, Comments, Likes, Notifications)}
+        routes = dict(run_scenarios(app, data, iterations, warmup))
+        with app.app_context():
+            queued = db.session.scalar(select(func.count()).select_from(OutboxEmail))
+    return {"sizes": sizes, "rows": counts, "seed": seed, "iterations": iterations, "warmup": warmup,
+            "seed_seconds": round(seeded, 2), "emails_queued": queued, "smtp_connections": len(smtp_attempts),
+            "uncovered": uncovered_endpoints(app), "routes": routes}
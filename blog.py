@@ -0,0 +1,312 @@
+import math
+import os
+from flask import Blueprint,render_template,request,url_for,redirect,flash,abort,session,jsonify,current_app
+from flask_login import current_user,login_required
+from database import db
+from forms import CreatePostForm,CommentForm
+from models import User,BlogPost,Comments,Notifications
+from counters import bump_counter,repair_unread_counts,notification_receivers
+from viewer import viewer_state
+from feed import new_seed,session_seed,feed_page
+from loaders import load_options
+from search import search_posts
+from mailer import enqueue_email,email_notification
+from inbox import create_notifications
+from pubsub import queue_event
+from likes import toggle_like
+from http_cache import conditional,post_validators,feed_validators,profile_validators,search_validators
+
+
+bp = Blueprint("blog", __name__)
+
+SEARCH_PAGE_SIZE = 10
+
+
+@bp.route('/')
+def home():
+    if request.args.get("refresh") == "1":
+        session["feed_seed"] = new_seed()
+        return redirect(url_for("blog.home"))
+    blogs = feed_page(session_seed(), 0, 5)
+
+    return render_template("index.html",blogs=blogs,home=True,**viewer_state(posts=blogs))
+
+@bp.route('/load_posts')
+@conditional(feed_validators)
+def load_posts():
+    offset = max(request.args.get('offset',0,type=int),0)
+    limit = min(max(request.args.get('limit',5,type=int),1),50)
+    blogs = feed_page(session_seed(), offset, limit)
+    if blogs:
+        return render_template("loaded_pages.html",blogs=blogs,**viewer_state(posts=blogs))
+    return ""
+
+
+@bp.route('/about')
+def about():
+    return render_template("about.html")
+
+
+@bp.route('/contact',methods=['GET','POST'])
+def contact():
+    if request.method == "POST":
+        name = request.form['username']
+        email = request.form['email']
+        phone = request.form['phone']
+        message = request.form['message']
+        enqueue_email(os.getenv('EMAIL_USER'), "Contact form submission",
+                      f"Username: {name}\nPhone_number: {phone}\nMessage: {message}",
+                      reply_to=email)
+        receiver = current_user.email
+        sub = "We Received Your Message"
+        msg = f"""Hello {current_user.name},
+
+Thank you for reaching out to us through our contact form. We've received your message:
+
+"{message}"
+
+Our team will review it and get back to you as soon as possible. 
+If you need urgent assistance, feel free to reply to this email.
+
+Best regards,  
+The Team"""
+        email_notification(receiver, sub, msg)
+        return render_template("contact.html",msg_sent=True)
+    else:
+        user_name = None
+        email = None
+        if current_user.is_authenticated:
+            user_name = current_user.name
+            email = current_user.email
+        return render_template("contact.html",msg_sent=False,username=user_name,email=email)
+
+
+@bp.route('/my_posts/<int:user_id>')
+@login_required
+@conditional(profile_validators)
+def my_posts(user_id):
+    # user = User.query.get(user_id)
+    user = User.query.get(user_id)
+    posts = BlogPost.query.options(*load_options("profile")).filter_by(author_id=user_id).order_by(BlogPost.created_at.desc()).all()
+    return render_template("my_posts.html", posts=posts,user=user,**viewer_state(posts=posts))
+
+
+@bp.route('/post/<int:id>', methods=['GET', 'POST'])
+@conditional(post_validators)
+def post_page(id):
+    edited = request.args.get('edited', default=0, type=int)
+    form = CommentForm()
+    post = BlogPost.query.options(*load_options("post_page")).filter_by(id=id).first_or_404()
+
+    if form.validate_on_submit():
+        if current_user.is_authenticated and not current_user.is_restricted:
+            new_comment = Comments(
+                text=form.comment.data,
+                author=current_user,
+                post=post
+            )
+            db.session.add(new_comment)
+            bump_counter(BlogPost, post.id, "comment_count", 1)
+            if post.author.id != current_user.id:
+                create_notifications(
+                    "Like",
+                    f'{current_user.name} commented on your post saying "{new_comment.text}".',
+                    receiver_id=post.author.id,
+                    sender_id=current_user.id,
+                    comment_id=new_comment.id,
+                )
+            db.session.commit()
+
+            # Handle AJAX
+            if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+                html = render_template("single_comment.html", comment=new_comment, liked_comments=set())
+                return jsonify(success=True, html=html)
+
+        else:
+            if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+                return jsonify(success=False, message="You must log in first.")
+            flash("You need to login or you may have been restricted.")
+            return redirect(url_for('auth.login'))
+
+    return render_template("post.html", post=post, form=form, edited=edited, **viewer_state(comments=post.comments))
+
+
+@bp.route('/delete_comment/<int:comment_id>')
+@login_required
+def delete_comment(comment_id):
+    comment = Comments.query.get_or_404(comment_id)
+    if (current_user.id == comment.author.id) or (current_user.is_admin) or (current_user.id == comment.post.author.id):
+        post_id = comment.post.id
+        bump_counter(BlogPost, post_id, "comment_count", -1)
+        receivers = notification_receivers(Notifications.comment_id == comment.id)
+        db.session.delete(comment)
+        db.session.flush()
+        repair_unread_counts(receivers)
+        db.session.commit()
+        return redirect(url_for('blog.post_page',id=post_id))
+    return redirect(url_for('blog.post_page',id=comment.post.id))
+
+
+@bp.route('/edit_comment/<int:comment_id>',methods=['GET','POST'])
+@login_required
+def edit_comment(comment_id):
+    comment = Comments.query.get_or_404(comment_id)
+    if request.method == "POST":
+        if current_user.id == comment.author.id:
+            comment.text = request.form['comment']
+            comment.edited = True
+            db.session.commit()
+            return redirect(url_for('blog.post_page',id=comment.post.id))
+        else:
+            return abort(403)
+    return redirect(url_for('blog.post_page',id=comment.post.id,edited=comment.id))
+
+
+@bp.route('/new_post',methods=['GET','POST'])
+@login_required
+def new_post():
+    forms = CreatePostForm()
+    if forms.validate_on_submit():
+        if current_user.is_restricted:
+            flash("You have been temporarily restricted, you can't make posts.")
+            return redirect(url_for('blog.home'))
+        new = BlogPost(title=forms.title.data,
+                       subtitle=forms.subtitle.data,
+                       body = forms.body.data,
+                       author = current_user,
+                       img_url = forms.img.data
+                       )
+        db.session.add(new)
+        db.session.commit()
+        return redirect(url_for("blog.home"))
+    return render_template("make-post.html",forms=forms)
+
+
+@bp.route('/edit/<int:id>',methods=['GET','POST'])
+@login_required
+def edit_post(id):
+    post = BlogPost.query.get_or_404(id)
+    forms = CreatePostForm(
+        title=post.title,
+        subtitle=post.subtitle,
+        body=post.body,
+        img=post.img_url
+    )
+    if forms.validate_on_submit():
+        post.title = forms.title.data
+        post.subtitle = forms.subtitle.data
+        post.body = forms.body.data
+        post.img_url = forms.img.data
+        db.session.commit()
+        return redirect(url_for("blog.post_page",id=post.id))
+    return render_template("make-post.html",forms=forms,edit=True)
+
+
+@bp.route("/delete/<int:id>")
+@login_required
+def delete_post(id):
+    blog = BlogPost.query.get_or_404(id)
+    author_id = blog.author.id
+    receivers = notification_receivers(db.or_(
+        Notifications.post_id == blog.id,
+        Notifications.comment_id.in_(db.select(Comments.id).where(Comments.post_id == blog.id)),
+    ))
+    db.session.delete(blog)
+    db.session.flush()
+    repair_unread_counts(receivers)
+    db.session.commit()
+    from_page = request.args.get('from')
+    if from_page:
+        return redirect(url_for("blog.home"))
+    return redirect(url_for("blog.my_posts",user_id=author_id))
+
+
+def like_notifications(column, added, removed):
+    # Notification side of a like change, shared by direct toggles and coalesced flushes
+    model = BlogPost if column == "post_id" else Comments
+    noun = "post" if column == "post_id" else "comment"
+    target_ids = {target_id for _, target_id in added + removed}
+    targets = {row.id: row for row in model.query.filter(model.id.in_(target_ids))} if target_ids else {}
+    if added:
+        names = dict(db.session.execute(
+            db.select(User.id, User.name).where(User.id.in_({author_id for author_id, _ in added}))).all())
+        for author_id, target_id in added:
+            target = targets.get(target_id)
+            if target is not None and target.author_id != author_id:
+                create_notifications("Like", f"{names[author_id]} liked your {noun}.",
+                                     receiver_id=target.author_id, sender_id=author_id, **{column: target_id})
+    for author_id, target_id in removed:
+        target = targets.get(target_id)
+        if target is None:
+            continue
+        # The receiver tells the like apart from a "commented on your post" notification the same
+        # user sent about their own comment, which is also of type Like
+        for notification in Notifications.query.filter_by(receiver_id=target.author_id, sender_id=author_id,
+                                                          type="Like", **{column: target_id}):
+            if not notification.is_read:
+                bump_counter(User, notification.receiver_id, "unread_count", -1)
+                queue_event(notification.receiver_id)
+            db.session.delete(notification)
+
+
+def toggle_and_notify(column, target):
+    like_coalescer = current_app.extensions.get("like_coalescer")
+    coalesced = like_coalescer.toggle(current_user.id, column, target.id, target.like_count) if like_coalescer else None
+    if coalesced:
+        return coalesced
+    liked, changed = toggle_like(current_user.id, column, target.id)
+    if changed:
+        pair = [(current_user.id, target.id)]
+        like_notifications(column, pair if liked else [], [] if liked else pair)
+    db.session.commit()
+    return liked, target.like_count
+
+
+@bp.route("/post_like/<int:post_id>",methods=['POST'])
+@login_required
+def post_like(post_id):
+    post = BlogPost.query.get_or_404(post_id)
+    liked, likes_count = toggle_and_notify("post_id", post)
+
+    if request.headers.get("X-Requested-With")=="XMLHttpRequest":
+        return jsonify({
+            "liked": liked,
+            "likes_count": likes_count
+        })
+    return redirect(request.referrer)
+
+
+@bp.route("/like_comment/<int:comment_id>", methods=['POST'])
+@login_required
+def like_comment(comment_id):
+    try:
+        comment = Comments.query.get_or_404(comment_id)
+        liked, likes_count = toggle_and_notify("comment_id", comment)
+
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return jsonify({
+                "liked": liked,
+                "likes_count": likes_count,
+                "success": True
+            })
+        return redirect(request.referrer or url_for('blog.post_page', id=comment.post.id))
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in like_comment: {str(e)}")
+        if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return jsonify({
+                "error": "Failed to process like",
+                "success": False
+            }), 500
+        return redirect(request.referrer or url_for('blog.home'))
+
+@bp.route("/search")
+@conditional(search_validators)
+def search():
+    query = request.args.get("q","").strip()
+    page = max(request.args.get("page",1,type=int),1)
+    search_result, found = search_posts(query, page, SEARCH_PAGE_SIZE)
+    pages = max(math.ceil(found / SEARCH_PAGE_SIZE), 1)
+    return render_template("search_posts.html",search_results=search_result,found=found,query=query,
+                           page=page,pages=pages,**viewer_state(posts=search_result))
@@ -0,0 +1,339 @@
+import glob
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+import click
+from flask import Blueprint,current_app
+from flask.cli import pass_script_info
+from werkzeug.security import generate_password_hash
+from database import db
+from models import User,BlogPost,Likes
+from counters import repair_counters,repair_unread_counts
+from loaders import QUERY_BUDGETS
+from profiling import count_queries,measure_startup,STARTUP_BUDGET,FORBIDDEN_MODULES
+from search import rebuild_index
+from mailer import run_worker
+from mail_check import check_retries
+from deletion import run_worker as run_deletion_worker,CHUNK_SIZE
+from query_plans import check_query_plans
+from assets import build as build_assets
+from template_cache import compile_templates
+from transfer import export_ndjson,import_ndjson
+import benchmark
+import migrations
+
+
+# Registered without a group, so commands keep their short names: flask init-db, flask mail-worker, ...
+bp = Blueprint("commands", __name__, cli_group=None)
+
+
+@bp.cli.command("init-db")
+def init_db():
+    # Creates missing tables and applies pending migrations. Run on deploy, before starting
+    # workers: the app itself never touches the schema.
+    db.create_all()
+    migrations.upgrade()
+    print("Database schema is up to date.")
+
+
+@bp.cli.command("repair-counters")
+def repair_counters_command():
+    repair_counters()
+    repair_unread_counts()
+    db.session.commit()
+    print("Like, comment and unread notification counters rebuilt.")
+
+
+@bp.cli.command("rebuild-search-index")
+def rebuild_search_index():
+    rebuild_index()
+    db.session.commit()
+    print("Search index rebuilt.")
+
+
+@bp.cli.command("mail-worker")
+@click.option("--batch-size", default=50, help="Messages sent per batch over one SMTP connection.")
+@click.option("--interval", default=5, help="Seconds to wait when the outbox is empty.")
+@click.option("--once", is_flag=True, help="Drain the outbox and exit instead of polling.")
+def mail_worker(batch_size, interval, once):
+    run_worker(batch_size=batch_size, interval=interval, once=once)
+
+
+@bp.cli.command("check-mail-retries", with_appcontext=False)
+def check_mail_retries():
+    # Drives the outbox worker through transient, permanent and repeated SMTP failures against
+    # a scripted server, on a throwaway SQLite database; nothing is sent
+    from main import create_app
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(directory, 'mail.db')}",
+                          "TEMPLATE_WARM_UP": False})
+        with app.app_context():
+            db.create_all()
+            results = list(check_retries())
+    failed = False
+    for name, status, attempts, problems in results:
+        failed = failed or bool(problems)
+        print(f"{'FAIL' if problems else 'ok  '} {name}: {status} after {attempts} attempt{'s' if attempts != 1 else ''}"
+              f"{': ' + '; '.join(problems) if problems else ''}")
+    if failed:
+        raise SystemExit(1)
+
+
+@bp.cli.command("deletion-worker")
+@click.option("--chunk-size", default=CHUNK_SIZE, help="Rows deleted per transaction.")
+@click.option("--interval", default=5, help="Seconds to wait when no account is pending deletion.")
+@click.option("--once", is_flag=True, help="Delete every pending account and exit instead of polling.")
+def deletion_worker(chunk_size, interval, once):
+    for deletion in run_deletion_worker(chunk_size=chunk_size, interval=interval, once=once):
+        elapsed = (deletion.finished_at - deletion.requested_at).total_seconds()
+        print(f"Deleted account {deletion.user_id} ({deletion.email}): {deletion.deleted_rows} rows, {elapsed:.1f}s after the request")
+
+
+def asset_sources():
+    # Everything that can put a class or id on a page: every template Jinja can load (extension
+    # macros such as render_form included), the site scripts, and views that flash categories
+    environment = current_app.jinja_env
+    for name in environment.list_templates(extensions=["html", "txt"]):
+        yield environment.loader.get_source(environment, name)[0]
+    for path in glob.glob(os.path.join(current_app.static_folder, "js", "**", "*.js"), recursive=True) + glob.glob(os.path.join(current_app.root_path, "*.py")):
+        with open(path, encoding="utf-8") as f:
+            yield f.read()
+
+
+@bp.cli.command("build-assets")
+def build_assets_command():
+    # Restart the app after a build; the manifest is read once per process
+    total_before = total_after = 0
+    for source, built, before, after, compressed in build_assets(current_app.static_folder, asset_sources()):
+        total_before += before
+        total_after += after
+        if before != after or compressed:
+            sizes = ", ".join(f"{name} {size}" for name, size in compressed.items())
+            print(f"{source} -> {built}: {before} -> {after} bytes{f' ({sizes})' if sizes else ''}")
+    print(f"Built static/dist: {total_before} -> {total_after} bytes before compression.")
+
+
+@bp.cli.command("compile-templates")
+def compile_templates_command():
+    # Run at build/deploy time so freshly started workers load bytecode instead of parsing templates
+    names = list(compile_templates(current_app.jinja_env))
+    print(f"Compiled {len(names)} templates into {current_app.config['JINJA_CACHE_DIR'] or 'memory (no JINJA_CACHE_DIR)'}.")
+
+
+@bp.cli.command("check-query-plans")
+def check_query_plans_command():
+    if db.engine.dialect.name != "sqlite":
+        print("Query plan checks use SQLite's EXPLAIN QUERY PLAN; skipping.")
+        return
+    failed = False
+    for name, plan, scans in check_query_plans():
+        failed = failed or bool(scans)
+        print(f"{'FAIL' if scans else 'ok  '} {name}: {' | '.join(plan)}")
+    if failed:
+        raise SystemExit(1)
+
+
+@bp.cli.command("like-load-test", with_appcontext=False)
+@click.option("--users", default=50, help="Concurrent likers on the one hot post.")
+@click.option("--toggles", default=20, help="Like/unlike toggles per user.")
+@click.option("--threads", default=8)
+@pass_script_info
+def like_load_test(info, users, toggles, threads):
+    # Hammers one post with toggles through the real route, then checks that no like
+    # was duplicated or lost and that like_count matches the rows. Everything it
+    # creates is removed again afterwards.
+    app = info.load_app()
+    like_coalescer = app.extensions.get("like_coalescer")
+    with app.app_context():
+        password = generate_password_hash("load-test", method="pbkdf2:sha256", salt_length=8)
+        likers = [User(email=f"load-test-{i}@example.invalid", password=password, name=f"Load Test {i}")
+                  for i in range(users + 1)]
+        db.session.add_all(likers)
+        db.session.flush()
+        post = BlogPost(title=f"Like load test {datetime.now().isoformat()}", subtitle="", body="", img_url="", author=likers[0])
+        db.session.add(post)
+        db.session.commit()
+        post_id, user_ids = post.id, [user.id for user in likers]
+
+    errors = []
+
+    def hammer(ids):
+        for user_id in ids:
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess["_user_id"] = str(user_id)
+            for _ in range(toggles):
+                response = client.post(f"/post_like/{post_id}", headers={"X-Requested-With": "XMLHttpRequest"})
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+    workers = [threading.Thread(target=hammer, args=(user_ids[1 + i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if like_coalescer:
+        like_coalescer.flush()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        rows = Likes.query.filter_by(post_id=post_id).count()
+        distinct = db.session.scalar(db.select(db.func.count(db.distinct(Likes.author_id))).where(Likes.post_id == post_id))
+        stored = db.session.get(BlogPost, post_id).like_count
+        expected = users if toggles % 2 else 0
+        total = users * toggles
+        print(f"{total} toggles in {elapsed:.2f}s: {total / elapsed:.0f} toggles/s "
+              f"({'coalesced' if like_coalescer else 'direct'}, {threads} threads, {len(errors)} errors)")
+        print(f"likes: {rows} rows, {distinct} distinct likers, like_count {stored}, expected {expected}")
+        # The database cascades the likes and notifications; deleting the post through the
+        # session first also drops it from the search index
+        db.session.delete(db.session.get(BlogPost, post_id))
+        for user in User.query.filter(User.id.in_(user_ids)):
+            db.session.delete(user)
+        db.session.commit()
+    if errors or not rows == distinct == stored == expected:
+        raise SystemExit(1)
+
+
+@bp.cli.command("check-query-counts", with_appcontext=False)
+@pass_script_info
+def check_query_counts(info):
+    app = info.load_app()
+    with app.app_context():
+        # The first account is the super admin, so it can open the dashboard too
+        user = User.query.order_by(User.id).first()
+        post = BlogPost.query.order_by((BlogPost.like_count + BlogPost.comment_count).desc()).first()
+        if not user or not post:
+            print("Need at least one user and one post to check query counts.")
+            return
+        routes = {
+            "home": "/",
+            "load_posts": "/load_posts?offset=0&limit=5",
+            "post_page": f"/post/{post.id}",
+            "search": f"/search?q={post.title.split()[0]}",
+            "my_posts": f"/my_posts/{post.author_id}",
+            "admin_dashboard": "/admin_dashboard?sort=posts&order=desc",
+        }
+        engine = db.engine
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user.id)
+    failed = False
+    for route, url in routes.items():
+        with count_queries(engine) as statements:
+            response = client.get(url)
+        # A route that errors out early runs few queries, so its status counts as much as its budget
+        ok = len(statements) <= QUERY_BUDGETS[route] and response.status_code in (200, 302)
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {route}: {len(statements)} queries "
+              f"(budget {QUERY_BUDGETS[route]}), status {response.status_code}")
+    if failed:
+        raise SystemExit(1)
+
+
+@bp.cli.command("check-import-time")
+@click.option("--runs", default=5, help="Fresh interpreters to start; the fastest run is compared to the budget.")
+def check_import_time(runs):
+    samples = [measure_startup(current_app.root_path) for _ in range(runs)]
+    best = min(samples, key=lambda sample: sample["import"] + sample["create_app"])
+    total = best["import"] + best["create_app"]
+    forbidden = sorted({module for sample in samples for module in sample["modules"]
+                        if module.startswith(FORBIDDEN_MODULES)})
+    print(f"{'FAIL' if total > STARTUP_BUDGET else 'ok  '} startup: import {best['import'] * 1000:.0f} ms + "
+          f"create_app {best['create_app'] * 1000:.0f} ms (budget {STARTUP_BUDGET * 1000:.0f} ms)")
+    print(f"{'FAIL' if forbidden else 'ok  '} forbidden modules: {', '.join(forbidden) or 'none'}")
+    if total > STARTUP_BUDGET or forbidden:
+        raise SystemExit(1)
+
+
+@bp.cli.command("export-content")
+@click.argument("path", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option("--batch-size", default=2000, help="Rows fetched from the database at a time.")
+def export_content(path, batch_size):
+    # Users (with password hashes), posts, comments and likes as NDJSON; a .gz path is compressed
+    counts = export_ndjson(path, batch_size)
+    click.echo(f"Exported {', '.join(f'{count} {table}' for table, count in counts.items())}.", err=path == "-")
+
+
+@bp.cli.command("import-content")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=5000, help="Rows inserted per transaction.")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoint of an earlier run of this file and start over.")
+def import_content(path, batch_size, restart):
+    # Ids are remapped, so the file can go into a database that already has content; users with
+    # a known email and posts with a known title are matched instead of duplicated
+    started = time.perf_counter()
+    totals = {}
+    for table, inserted, skipped, line in import_ndjson(path, batch_size, restart):
+        done = totals.setdefault(table, [0, 0])
+        done[0] += inserted
+        done[1] += skipped
+        print(f"line {line}: {table} +{inserted}" + (f" ({skipped} already present or orphaned)" if skipped else ""))
+    # Bulk inserts bypass the ORM hooks that keep counters and the search index current
+    repair_counters()
+    repair_unread_counts()
+    rebuild_index()
+    db.session.commit()
+    summary = ", ".join(f"{inserted} {table} ({skipped} skipped)" for table, (inserted, skipped) in totals.items())
+    print(f"Imported {summary or 'nothing new'} in {time.perf_counter() - started:.1f}s; counters and search index rebuilt.")
+
+
+def config_value(text):
+    # Numbers and booleans arrive as JSON (SQL_SAMPLE_RATE=0.5, TEMPLATE_WARM_UP=true), anything else as a string
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+@bp.cli.command("benchmark", with_appcontext=False)
+@click.option("--users", default=benchmark.SIZES["users"])
+@click.option("--posts", default=benchmark.SIZES["posts"])
+@click.option("--comments", default=benchmark.SIZES["comments"])
+@click.option("--likes", default=benchmark.SIZES["likes"])
+@click.option("--notifications", default=benchmark.SIZES["notifications"])
+@click.option("--iterations", default=20, help="Timed requests per scenario.")
+@click.option("--warmup", default=2, help="Untimed requests per scenario before timing starts.")
+@click.option("--seed", default=1, help="Random seed for the generated data.")
+@click.option("--config", "overrides", multiple=True, help="KEY=VALUE app config override, e.g. FRAGMENT_CACHE=none.")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results as JSON.")
+@click.option("--compare", type=click.Path(exists=True, dir_okay=False), help="JSON from an earlier run to diff against.")
+def benchmark_command(users, posts, comments, likes, notifications, iterations, warmup, seed, overrides, output, compare):
+    # Seeds a throwaway SQLite database (never the configured one) and drives every route
+    # through the test client. Runs offline: mail stays in the outbox and SMTP is stubbed.
+    from main import create_app
+    overrides = {key: config_value(value) for key, value in (override.split("=", 1) for override in overrides)}
+    sizes = {"users": users, "posts": posts, "comments": comments, "likes": likes, "notifications": notifications}
+    with tempfile.TemporaryDirectory() as directory:
+        config = {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(directory, 'benchmark.db')}",
+                  "WTF_CSRF_ENABLED": False, "TEMPLATE_WARM_UP": False}
+        config.update(overrides)
+        app = create_app(config)
+        results = benchmark.run(app, sizes, iterations=iterations, warmup=warmup, seed=seed)
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app.root_path, capture_output=True, text=True)
+    results = {"commit": commit.stdout.strip() or None, "date": datetime.utcnow().isoformat(timespec="seconds"),
+               "config": overrides, **results}
+    previous = {}
+    if compare:
+        with open(compare) as f:
+            previous = json.load(f)["routes"]
+    print(f"Seeded {results['rows']} in {results['seed_seconds']}s; {iterations} timed requests per scenario")
+    print(f"{'scenario':<22}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'peak KiB':>10}  status" + ("   p50 vs before" if compare else ""))
+    for name, route in results["routes"].items():
+        line = (f"{name:<22}{route['p50_ms']:>9.2f}{route['p95_ms']:>9.2f}{route['queries']:>9g}"
+                f"{route['peak_kib']:>10.1f}  {','.join(map(str, route['status']))}")
+        if name in previous and previous[name]["p50_ms"]:
+            line += f"   {route['p50_ms'] / previous[name]['p50_ms'] - 1:+.0%} (queries {previous[name]['queries']:g})"
+        print(line)
+    print(f"{results['emails_queued']} emails queued, {results['smtp_connections']} SMTP connections attempted")
+    if results["uncovered"]:
+        print(f"Routes without a scenario: {', '.join(results['uncovered'])}")
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=1)
+        print(f"Results written to {output}")
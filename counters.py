@@ -0,0 +1,75 @@
+from datetime import datetime
+from sqlalchemy import select, update, func
+from database import db
+from models import BlogPost, Comments, Likes, Notifications, User
+from pubsub import queue_event
+from user_cache import forget_user
+
+
+def bump_counter(model, row_id, column, delta):
+    bump_counters(model, [row_id], column, delta)
+
+
+def bump_counters(model, row_ids, column, delta):
+    # Single UPDATE ... SET col = col + delta so concurrent toggles never lose a write
+    counter = getattr(model, column)
+    db.session.execute(
+        update(model).where(model.id.in_(row_ids)).values({column: counter + delta, **stamp_values(model)})
+    )
+    if model is Comments:
+        touch_posts_of_comments(row_ids)
+    elif model is User:
+        for row_id in row_ids:
+            forget_user(row_id)
+
+
+def stamp_values(model):
+    # Counters are rendered into cached fragments and page validators, so moving one retires both
+    values = {}
+    if hasattr(model, "version"):
+        values["version"] = model.version + 1
+    if hasattr(model, "updated_at"):
+        values["updated_at"] = datetime.utcnow()
+    return values
+
+
+def touch_posts_of_comments(comment_ids):
+    posts = select(Comments.post_id).where(Comments.id.in_(comment_ids))
+    db.session.execute(update(BlogPost).where(BlogPost.id.in_(posts)).values(stamp_values(BlogPost)),
+                       execution_options={"synchronize_session": False})
+
+
+def repair_counters(post_ids=None, comment_ids=None):
+    post_likes = select(func.count(Likes.id)).where(Likes.post_id == BlogPost.id).scalar_subquery()
+    post_comments = select(func.count(Comments.id)).where(Comments.post_id == BlogPost.id).scalar_subquery()
+    posts = update(BlogPost).values(like_count=post_likes, comment_count=post_comments, **stamp_values(BlogPost))
+    if post_ids is not None:
+        posts = posts.where(BlogPost.id.in_(post_ids))
+
+    comment_likes = select(func.count(Likes.id)).where(Likes.comment_id == Comments.id).scalar_subquery()
+    comments = update(Comments).values(like_count=comment_likes, **stamp_values(Comments))
+    if comment_ids is not None:
+        comments = comments.where(Comments.id.in_(comment_ids))
+
+    db.session.execute(posts, execution_options={"synchronize_session": False})
+    db.session.execute(comments, execution_options={"synchronize_session": False})
+    if comment_ids:
+        touch_posts_of_comments(comment_ids)
+
+
+def repair_unread_counts(user_ids=None):
+    unread = (select(func.count(Notifications.id))
+              .where(Notifications.receiver_id == User.id, Notifications.is_read == False)
+              .scalar_subquery())
+    users = update(User).values(unread_count=unread)
+    if user_ids is not None:
+        users = users.where(User.id.in_(user_ids))
+    db.session.execute(users, execution_options={"synchronize_session": False})
+    for user_id in user_ids or ():
+        queue_event(user_id)
+        forget_user(user_id)
+
+
+def notification_receivers(*criteria):
+    # Users whose unread counter must be recomputed once these notifications are cascade-deleted
+    return set(db.session.scalars(select(Notifications.receiver_id).where(*criteria).distinct()))
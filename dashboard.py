@@ -0,0 +1,85 @@
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, func, literal, union_all, or_
+from database import db
+from models import User, BlogPost, Comments, Likes, OutboxEmail, AccountDeletion
+
+
+USERS_PER_PAGE = 50
+ACTIVITY = ("posts", "comments", "likes")
+COLUMN_SORTS = {"id": User.id, "name": User.name, "email": User.email}
+SORTS = (*COLUMN_SORTS, *ACTIVITY)
+ROLES = {"admin": User.is_admin == True, "user": User.is_admin == False}
+
+
+def activity_counts(user_ids=None):
+    # Posts, comments and likes per author in one GROUP BY over a UNION ALL of the three
+    # tables; limited to `user_ids`, each branch is an index range on author_id
+    branches = []
+    for kind, model in zip(ACTIVITY, (BlogPost, Comments, Likes)):
+        branch = select(model.author_id.label("user_id"), *(literal(int(kind == other)).label(other) for other in ACTIVITY))
+        if user_ids is not None:
+            branch = branch.where(model.author_id.in_(user_ids))
+        branches.append(branch)
+    activity = union_all(*branches).subquery()
+    return (select(activity.c.user_id, *(func.sum(activity.c[kind]).label(kind) for kind in ACTIVITY))
+            .group_by(activity.c.user_id))
+
+
+def user_filters(role=None, restricted=None, prefix=None):
+    criteria = []
+    if role in ROLES:
+        criteria.append(ROLES[role])
+    if restricted in ("yes", "no"):
+        criteria.append(User.is_restricted == (restricted == "yes"))
+    if prefix:
+        criteria.append(or_(User.name.startswith(prefix, autoescape=True), User.email.startswith(prefix, autoescape=True)))
+    return criteria
+
+
+def user_page(criteria, sort="id", descending=False, page=1):
+    # ([{"user", "posts", "comments", "likes"}], matching users). Sorting by a column pages the
+    # users first and counts only that page; sorting by a count has to aggregate everyone.
+    found = db.session.scalar(select(func.count(User.id)).where(*criteria))
+    offset = (page - 1) * USERS_PER_PAGE
+    if sort in ACTIVITY:
+        counts = activity_counts().subquery()
+        totals = [func.coalesce(counts.c[kind], 0).label(kind) for kind in ACTIVITY]
+        key = totals[ACTIVITY.index(sort)]
+        rows = db.session.execute(
+            select(User, *totals).outerjoin(counts, counts.c.user_id == User.id).where(*criteria)
+            .order_by(key.desc() if descending else key, User.id).offset(offset).limit(USERS_PER_PAGE)
+        ).all()
+        return [{"user": user, **dict(zip(ACTIVITY, values))} for user, *values in rows], found
+    column = COLUMN_SORTS.get(sort, User.id)
+    users = db.session.scalars(
+        select(User).where(*criteria).order_by(column.desc() if descending else column, User.id)
+        .offset(offset).limit(USERS_PER_PAGE)
+    ).all()
+    counts = {row.user_id: row for row in db.session.execute(activity_counts([user.id for user in users]))} if users else {}
+    return [{"user": user, **{kind: getattr(counts.get(user.id), kind, 0) for kind in ACTIVITY}} for user in users], found
+
+
+def site_totals():
+    # Counting every table on each dashboard view is what made it slow; the totals are
+    # recomputed at most once per ADMIN_TOTALS_TTL seconds in each worker
+    extension = current_app.extensions
+    cached = extension.get("site_totals")
+    now = time.monotonic()
+    if cached is None or cached[0] <= now:
+        count = lambda model, *criteria: select(func.count(model.id)).where(*criteria).scalar_subquery()
+        totals = db.session.execute(select(
+            count(User).label("users"),
+            count(User, User.is_admin == True).label("admins"),
+            count(User, User.is_restricted == True).label("restricted"),
+            count(BlogPost).label("posts"),
+            count(Comments).label("comments"),
+            count(Likes).label("likes"),
+            select(func.coalesce(func.sum(User.unread_count), 0)).scalar_subquery().label("unread_notifications"),
+            count(OutboxEmail, OutboxEmail.status == "pending").label("pending_emails"),
+            count(AccountDeletion, AccountDeletion.finished_at.is_(None)).label("pending_deletions"),
+        )).one()._asdict()
+        totals["refreshed_at"] = datetime.utcnow()
+        cached = extension["site_totals"] = (now + current_app.config.get("ADMIN_TOTALS_TTL", 300), totals)
+    return cached[1]
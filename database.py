@@ -1,4 +1,9 @@
+import os
+import sqlite3
+import weakref
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -6,8 +11,30 @@ class Base(DeclarativeBase):
     pass
 db = SQLAlchemy(model_class=Base)
 
+# Engines of every app created in this process. A forked worker (gunicorn --preload) must not
+# reuse the pooled connections it inherited, so each child drops them without closing the
+# parent's sockets and opens its own on first use.
+forked_engines = weakref.WeakSet()
 
 
+def track_engines(app):
+    with app.app_context():
+        forked_engines.update(db.engines.values())
 
 
+def dispose_inherited_engines():
+    for engine in list(forked_engines):
+        engine.dispose(close=False)
 
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=dispose_inherited_engines)
+
+
+@event.listens_for(Engine, "connect")
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys, ON DELETE CASCADE included, unless each connection opts in
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
@@ -0,0 +1,118 @@
+import time
+from datetime import datetime
+from sqlalchemy import select, delete, or_
+from database import db
+from models import User, BlogPost, Comments, Likes, Notifications, AccountDeletion
+from counters import repair_counters, repair_unread_counts, notification_receivers
+from mailer import enqueue_emails
+from search import search_backend
+
+
+# Rows deleted per transaction; each chunk holds the write lock for about as long as a bulk like flush
+CHUNK_SIZE = 1000
+
+DELETED_EMAIL = ("Your Account Has Been Deleted", """Hello {name},
+
+We’re reaching out to confirm that your account has been permanently deleted from our system.
+
+All your posts, comments, and associated data have been removed as part of this process.
+We’re sorry to see you go — if you’d like to return, you’re always welcome to create a new account in the future.
+
+Best regards,
+The Team""")
+
+
+def own_posts(user_id):
+    return select(BlogPost.id).where(BlogPost.author_id == user_id)
+
+
+# (step, model, the account's rows in it) in the order they are deleted. Each step empties what
+# the next one would otherwise cascade into, so deleting a chunk never fans out further than
+# one comment's likes and notifications.
+STEPS = (
+    ("likes", Likes, lambda user_id: Likes.author_id == user_id),
+    ("comments", Comments, lambda user_id: Comments.author_id == user_id),
+    ("post_comments", Comments, lambda user_id: Comments.post_id.in_(own_posts(user_id))),
+    ("post_likes", Likes, lambda user_id: Likes.post_id.in_(own_posts(user_id))),
+    ("notifications", Notifications, lambda user_id: or_(Notifications.receiver_id == user_id, Notifications.sender_id == user_id,
+                                                         Notifications.post_id.in_(own_posts(user_id)))),
+    ("posts", BlogPost, lambda user_id: BlogPost.author_id == user_id),
+)
+
+
+def schedule_deletions(users, requested_by):
+    # Called with the UPDATE that sets pending_deletion, in the same transaction
+    now = datetime.utcnow()
+    db.session.execute(AccountDeletion.__table__.insert(), [
+        {"user_id": user.id, "name": user.name, "email": user.email, "requested_by": requested_by.id,
+         "requested_at": now, "step": "pending", "deleted_rows": 0}
+        for user in users
+    ])
+
+
+def delete_chunk(model, ids):
+    # Deletes rows by id with one statement and repairs the counters that included them;
+    # the database cascades the rest
+    post_ids, comment_ids, receivers = set(), set(), set()
+    if model is Likes:
+        for post_id, comment_id in db.session.execute(select(Likes.post_id, Likes.comment_id).where(Likes.id.in_(ids))):
+            post_ids.add(post_id) if post_id is not None else comment_ids.add(comment_id)
+    elif model is Comments:
+        post_ids.update(db.session.scalars(select(Comments.post_id).where(Comments.id.in_(ids)).distinct()))
+        receivers = notification_receivers(Notifications.comment_id.in_(ids))
+    elif model is Notifications:
+        receivers = notification_receivers(Notifications.id.in_(ids), Notifications.is_read == False)
+    elif model is BlogPost:
+        receivers = notification_receivers(Notifications.post_id.in_(ids))
+        search_backend().remove_posts(db.session.connection(), ids)
+    db.session.execute(delete(model).where(model.id.in_(ids)), execution_options={"synchronize_session": False})
+    if post_ids or comment_ids:
+        repair_counters(post_ids, comment_ids)
+    if receivers:
+        repair_unread_counts(receivers)
+
+
+def advance(deletion, chunk_size=CHUNK_SIZE):
+    # Deletes the next chunk of the account and records the progress in the same transaction,
+    # so a restarted worker carries on where it stopped. False once the user row itself is gone.
+    for step, model, rows in STEPS:
+        ids = db.session.scalars(select(model.id).where(rows(deletion.user_id)).limit(chunk_size)).all()
+        if ids:
+            delete_chunk(model, ids)
+            deletion.step = step
+            deletion.deleted_rows += len(ids)
+            db.session.commit()
+            return True
+    user = db.session.get(User, deletion.user_id)
+    if user is not None:
+        subject, body = DELETED_EMAIL
+        enqueue_emails([(user.email, subject, body.format(name=user.name))])
+        db.session.delete(user)
+        deletion.deleted_rows += 1
+    deletion.step = "done"
+    deletion.finished_at = datetime.utcnow()
+    db.session.commit()
+    return False
+
+
+def next_deletion():
+    return db.session.scalars(
+        select(AccountDeletion).where(AccountDeletion.finished_at.is_(None))
+        .order_by(AccountDeletion.requested_at, AccountDeletion.id).limit(1)
+    ).first()
+
+
+def run_worker(chunk_size=CHUNK_SIZE, interval=5, once=False):
+    # Yields each finished deletion. Accounts are deleted oldest request first, one chunk per
+    # transaction, so web requests keep getting the database between chunks.
+    while True:
+        deletion = next_deletion()
+        if deletion is None:
+            if once:
+                return
+            db.session.remove()
+            time.sleep(interval)
+            continue
+        while advance(deletion, chunk_size):
+            pass
+        yield deletion
@@ -0,0 +1,43 @@
+import random
+from flask import session
+from sqlalchemy import select
+from models import BlogPost
+from loaders import load_options
+
+
+# Largest 31-bit prime. The affine step spreads ids across [0, PRIME) and the
+# squaring breaks up its arithmetic pattern; ties are settled by id. Every seed
+# gives a different but fully repeatable order, computed in SQL.
+PRIME = 2147483647
+
+
+def new_seed():
+    return random.randrange(1, PRIME) * PRIME + random.randrange(PRIME)
+
+
+def session_seed():
+    session.pop("ordered_post", None)
+    if "feed_seed" not in session:
+        session["feed_seed"] = new_seed()
+    return session["feed_seed"]
+
+
+def shuffle_key(seed):
+    multiplier, offset = divmod(seed, PRIME)
+    spread = (BlogPost.id * multiplier + offset) % PRIME
+    return (spread * spread) % PRIME
+
+
+def page_ids(seed, offset=0, limit=5):
+    # No index can produce a computed order, so every post is sorted. Sorting ids alone reads
+    # them off a covering index and keeps bodies out of the sorter; only the page's rows are loaded.
+    key = shuffle_key(seed)
+    return select(BlogPost.id, key.label("position")).order_by(key, BlogPost.id).offset(offset).limit(limit)
+
+
+def feed_page(seed, offset=0, limit=5):
+    page = page_ids(seed, offset, limit).subquery()
+    return (BlogPost.query.options(*load_options("feed"))
+            .join(page, page.c.id == BlogPost.id)
+            .order_by(page.c.position, BlogPost.id)
+            .all())
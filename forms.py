@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField,PasswordField,BooleanField
+from wtforms import StringField, SubmitField,PasswordField,BooleanField,SelectField
 from wtforms.validators import DataRequired, URL, Email,Length,EqualTo
 from flask_ckeditor import CKEditorField
 
@@ -91,3 +91,14 @@ class PassReset(FlaskForm):
         validators=[DataRequired(), EqualTo("new_password", message="Passwords must match")]
     )
     submit = SubmitField("Reset")
+
+class BulkModerationForm(FlaskForm):
+    # The selected users arrive as user_ids checkboxes from the dashboard table
+    action = SelectField(
+        "Action",
+        choices=[("restrict", "Restrict"), ("unrestrict", "Unrestrict"), ("promote", "Promote"),
+                 ("demote", "Demote"), ("remove", "Delete")],
+        validators=[DataRequired()],
+        render_kw={"class": "form-select form-select-sm"}
+    )
+    submit = SubmitField("Apply to selected", render_kw={"class": "btn btn-sm btn-outline-light"})
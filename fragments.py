@@ -0,0 +1,158 @@
+import re
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from flask import current_app, render_template
+from jinja2 import pass_context
+from markupsafe import Markup, escape
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.utils import import_string
+from models import BlogPost, Comments
+
+
+# Cached partials per model. They render from the row alone: anything that
+# depends on who is looking goes through slot() and is filled in per request.
+FRAGMENTS = {
+    BlogPost: ("fragments/feed_card.html", "fragments/post_header.html", "fragments/post_body.html"),
+    Comments: ("fragments/comment.html",),
+}
+# Stamped once when a row is created. SQLite hands a deleted row's id (max rowid + 1) to the
+# next insert, so the id alone could serve a deleted row's fragment for its successor.
+CREATED = {BlogPost: "created_at", Comments: "date"}
+SLOT = re.compile(r"<!--slot:(\w+)-->")
+
+
+def fragment_key(template, obj):
+    return f"{template}:{obj.id}:{getattr(obj, CREATED[type(obj)]).isoformat()}"
+
+
+class LRUBackend:
+    # Values are (version, html); bounded by entry count and total html size
+    def __init__(self, config):
+        self.max_entries = config.get("FRAGMENT_CACHE_SIZE", 2000)
+        self.max_bytes = config.get("FRAGMENT_CACHE_BYTES", 16 * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self._pop(key)
+            self.entries[key] = value
+            self.size += len(value[1])
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                self._pop(next(iter(self.entries)))
+
+    def delete(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        value = self.entries.pop(key, None)
+        if value is not None:
+            self.size -= len(value[1])
+
+
+class NullBackend:
+    def __init__(self, config):
+        pass
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+BACKENDS = {
+    "memory": LRUBackend,
+    "none": NullBackend,
+}
+
+
+class FragmentCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, template, slots, obj, context):
+        # The version in the stored value retires a fragment as soon as its row changes, and
+        # the creation stamp in the key tells a reused id apart, which keeps a cache shared
+        # between workers correct without cross-process purges.
+        key = fragment_key(template, obj)
+        cached = self.backend.get(key)
+        if cached is not None and cached[0] == obj.version:
+            self.hits += 1
+            html = cached[1]
+        else:
+            self.misses += 1
+            html = render_template(template, **context)
+            self.backend.set(key, (obj.version, html))
+        return Markup(SLOT.sub(lambda match: str(escape(slots.get(match.group(1), ""))), html))
+
+    def forget(self, obj):
+        for template in FRAGMENTS[type(obj)]:
+            self.backend.delete(fragment_key(template, obj))
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+def fragment_cache():
+    extension = current_app.extensions
+    if "fragment_cache" not in extension:
+        name = current_app.config.get("FRAGMENT_CACHE") or "memory"
+        backend_class = BACKENDS[name] if name in BACKENDS else import_string(name)
+        extension["fragment_cache"] = FragmentCache(backend_class(current_app.config))
+    return extension["fragment_cache"]
+
+
+def fragment(template, slots=None, **context):
+    # {{ fragment("fragments/comment.html", comment=comment, slots={...}) }}
+    (obj,) = context.values()
+    return fragment_cache().render(template, slots or {}, obj, context)
+
+
+@pass_context
+def slot(context, name):
+    # A plain {% include %} of a fragment (e.g. a comment being edited) brings its slot values along as `fill`
+    fill = context.get("fill")
+    if fill is not None:
+        return escape(fill.get(name, ""))
+    return Markup(f"<!--slot:{name}-->")
+
+
+@event.listens_for(Session, "before_flush")
+def bump_fragment_versions(session, flush_context, instances):
+    changed = {obj for obj in session.dirty
+               if type(obj) in FRAGMENTS and session.is_modified(obj, include_collections=False)}
+    # An edited comment also changes the page of the post it sits on
+    changed.update(obj.post for obj in list(changed) if isinstance(obj, Comments) and obj.post is not None)
+    for obj in changed:
+        # SQL-side increment: the in-memory version may be behind a bulk counter UPDATE
+        obj.version = type(obj).version + 1
+        if hasattr(obj, "updated_at"):
+            obj.updated_at = datetime.utcnow()
+
+
+@event.listens_for(Session, "after_flush")
+def forget_deleted_fragments(session, flush_context):
+    deleted = [obj for obj in session.deleted if type(obj) in FRAGMENTS]
+    if deleted:
+        cache = fragment_cache()
+        for obj in deleted:
+            cache.forget(obj)
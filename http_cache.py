@@ -0,0 +1,92 @@
+import hashlib
+import time
+from functools import wraps
+from flask import request, session, make_response
+from flask_login import current_user
+from sqlalchemy import select, func
+from werkzeug.http import is_resource_modified
+from database import db
+from models import BlogPost
+
+
+# Forms carry a CSRF token that Flask-WTF accepts for an hour; pages with a
+# form get a new ETag every half hour so a revalidated copy never holds a dead token.
+CSRF_PERIOD = 1800
+
+
+def viewer_key():
+    # The header badge, admin controls and liked state all depend on who is looking
+    if current_user.is_authenticated:
+        return ("user", current_user.id, current_user.is_admin, current_user.is_restricted, current_user.unread_count)
+    return ("anonymous",)
+
+
+def make_etag(parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def post_validators(id):
+    # Everything on a post page (comments and likes included) moves the post's version
+    version = db.session.execute(select(BlogPost.version).where(BlogPost.id == id)).scalar()
+    if version is None:
+        return None
+    return ("post", id, version, int(time.time() // CSRF_PERIOD))
+
+
+def all_posts_stamp(*criteria):
+    # Any edit, like or comment moves updated_at; the count catches deletions
+    return db.session.execute(select(func.max(BlogPost.updated_at), func.count(BlogPost.id)).where(*criteria)).one()
+
+
+def feed_validators():
+    seed = session.get("feed_seed")
+    if seed is None:
+        return None
+    return ("feed", seed, *all_posts_stamp())
+
+
+def profile_validators(user_id):
+    return ("profile", user_id, *all_posts_stamp(BlogPost.author_id == user_id))
+
+
+def search_validators():
+    return ("search", *all_posts_stamp())
+
+
+def conditional(validators):
+    # Answers If-None-Match with 304 before the view runs. validators(**view_args) returns the
+    # etag parts, or None to skip. There is no Last-Modified: every page also depends on the
+    # viewer and the CSRF period, and a bare If-Modified-Since would revalidate an anonymous
+    # copy for a logged-in user, or a page whose form token has expired.
+    def decorator(fun):
+        @wraps(fun)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or session.get("_flashes"):
+                return fun(*args, **kwargs)
+            stamp = validators(*args, **kwargs)
+            if stamp is None:
+                return fun(*args, **kwargs)
+            etag = make_etag(stamp + viewer_key())
+            if is_resource_modified(request.environ, etag=etag):
+                response = make_response(fun(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = make_response("", 304)
+            response.set_etag(etag, weak=True)
+            cache_headers(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_headers(response):
+    # Caches must revalidate every time (cheap now) and keep one copy per cookie. Only
+    # anonymous responses that set no cookie of their own may sit in a shared cache.
+    response.vary.add("Cookie")
+    shared = not current_user.is_authenticated and not session.modified
+    response.cache_control.no_cache = True
+    if shared:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
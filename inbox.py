@@ -0,0 +1,75 @@
+from datetime import datetime
+from sqlalchemy import update, tuple_
+from database import db
+from models import Notifications, User
+from loaders import load_options
+from counters import bump_counter
+from pubsub import queue_event
+
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(notification):
+    return f"{notification.timestamp.isoformat()}_{notification.id}"
+
+
+def decode_cursor(cursor):
+    timestamp, _, notification_id = (cursor or "").rpartition("_")
+    try:
+        return datetime.fromisoformat(timestamp), int(notification_id)
+    except ValueError:
+        return None
+
+
+def inbox_page(user_id, before=None, limit=PAGE_SIZE):
+    # Keyset pagination on (timestamp, id): served by ix_notifications_receiver_time however deep the user scrolls
+    query = (Notifications.query.options(*load_options("inbox"))
+             .filter(Notifications.receiver_id == user_id))
+    if before is not None:
+        query = query.filter(tuple_(Notifications.timestamp, Notifications.id) < before)
+    rows = query.order_by(Notifications.timestamp.desc(), Notifications.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def mark_read(user_id, notifications):
+    # One UPDATE for the rows just shown instead of flushing each ORM object
+    ids = [notification.id for notification in notifications if not notification.is_read]
+    if not ids:
+        return
+    result = db.session.execute(
+        update(Notifications)
+        .where(Notifications.receiver_id == user_id, Notifications.is_read == False, Notifications.id.in_(ids))
+        .values(is_read=True),
+        execution_options={"synchronize_session": False},
+    )
+    bump_counter(User, user_id, "unread_count", -result.rowcount)
+    queue_event(user_id)
+
+
+def create_notifications(type,message,receiver_id,sender_id,post_id=None,comment_id=None,is_admin_message=None):
+    if not is_admin_message:
+        existing = Notifications.query.filter_by(
+            type=type,
+            message=message,
+            receiver_id=receiver_id,
+            sender_id=sender_id,
+            post_id=post_id,
+            comment_id=comment_id
+        ).first()
+        if existing:
+            return
+
+    new_notification = Notifications(
+        type=type,
+        message=message,
+        receiver_id=receiver_id,
+        sender_id=sender_id,
+        post_id=post_id,
+        comment_id=comment_id
+    )
+    db.session.add(new_notification)
+    bump_counter(User, receiver_id, "unread_count", 1)
+    db.session.flush()
+    queue_event(receiver_id, new_notification.id)
@@ -0,0 +1,180 @@
+import atexit
+import threading
+import time
+from collections import Counter
+from importlib import import_module
+from sqlalchemy import select, delete, tuple_
+from database import db
+from models import BlogPost, Comments, Likes, User
+from counters import bump_counter
+
+
+# Likes.<column> -> model whose like_count it feeds
+TARGETS = {"post_id": BlogPost, "comment_id": Comments}
+# Flushes a buffered toggle may fail (e.g. "database is locked" under load) before it is dropped
+FLUSH_ATTEMPTS = 3
+
+
+def insert_ignore(rows):
+    # INSERT ... ON CONFLICT DO NOTHING: the unique (author, target) index turns a duplicate into a no-op
+    dialect = db.session.get_bind().dialect.name
+    # Looked up per call: the engine has already loaded its own dialect, and importing
+    # the postgresql one up front would add ~40 ms to every startup on SQLite
+    module = import_module("sqlalchemy.dialects.postgresql" if dialect == "postgresql" else "sqlalchemy.dialects.sqlite")
+    return module.insert(Likes).values(rows).on_conflict_do_nothing()
+
+
+def add_likes(column, pairs):
+    # pairs of (author_id, target_id); returns the ones that were actually inserted
+    if not pairs:
+        return []
+    target = getattr(Likes, column)
+    rows = [{"author_id": author_id, column: target_id} for author_id, target_id in pairs]
+    added = [tuple(row) for row in db.session.execute(insert_ignore(rows).returning(Likes.author_id, target))]
+    bump_targets(column, added, 1)
+    return added
+
+
+def existing_pairs(column, pairs):
+    # Buffered likes whose author or target was deleted since the click; inserting them would
+    # fail the foreign keys and with them the whole flush
+    model = TARGETS[column]
+    targets = set(db.session.scalars(select(model.id).where(model.id.in_({target_id for _, target_id in pairs}))))
+    authors = set(db.session.scalars(select(User.id).where(User.id.in_({author_id for author_id, _ in pairs}))))
+    return [(author_id, target_id) for author_id, target_id in pairs if author_id in authors and target_id in targets]
+
+
+def remove_likes(column, pairs):
+    if not pairs:
+        return []
+    target = getattr(Likes, column)
+    removed = [tuple(row) for row in db.session.execute(
+        delete(Likes).where(tuple_(Likes.author_id, target).in_(pairs)).returning(Likes.author_id, target),
+        execution_options={"synchronize_session": False},
+    )]
+    bump_targets(column, removed, -1)
+    return removed
+
+
+def bump_targets(column, pairs, sign):
+    for target_id, count in Counter(target_id for _, target_id in pairs).items():
+        bump_counter(TARGETS[column], target_id, "like_count", sign * count)
+
+
+def toggle_like(author_id, column, target_id):
+    # Delete first: if a row went away the user had liked it, otherwise insert.
+    # Returns (liked, changed); changed is False when a concurrent toggle got there first.
+    if remove_likes(column, [(author_id, target_id)]):
+        return False, True
+    return True, bool(add_likes(column, [(author_id, target_id)]))
+
+
+class LikeCoalescer:
+    # Buffers toggles on hot targets in memory and writes only the net effect
+    # every `interval` seconds, so a burst of like/unlike on a viral post costs
+    # one batched INSERT and DELETE instead of a transaction per click. State is
+    # per process: other workers see a buffered like once it has been flushed.
+    def __init__(self, app, interval, threshold, on_flush):
+        self.app = app
+        self.interval = interval
+        self.threshold = threshold
+        self.on_flush = on_flush
+        self.lock = threading.Lock()
+        # Held for a whole flush so nobody reads the stored state of a half-written batch
+        self.flushing = threading.Lock()
+        # (column, target_id, author_id) -> [liked in the database, liked now]
+        self.pending = {}
+        # key -> flushes that failed with this toggle in them
+        self.failures = Counter()
+        self.recent = Counter()
+        self.window_start = time.monotonic()
+        self.worker = None
+        atexit.register(self.shutdown)
+
+    def is_hot(self, column, target_id):
+        now = time.monotonic()
+        if now - self.window_start > self.interval:
+            self.recent.clear()
+            self.window_start = now
+        self.recent[column, target_id] += 1
+        return self.recent[column, target_id] > self.threshold
+
+    def toggle(self, author_id, column, target_id, stored_count):
+        # Returns (liked, like count) when buffered, None when the caller should write through
+        key = (column, target_id, author_id)
+        with self.lock:
+            if key not in self.pending and not self.is_hot(column, target_id):
+                return None
+        stored = None
+        while True:
+            with self.lock:
+                state = self.pending.get(key)
+                if state is None and stored is not None:
+                    state = self.pending[key] = [stored, stored]
+                if state is not None:
+                    state[1] = not state[1]
+                    delta = sum(now - before for (col, tid, _), (before, now) in self.pending.items()
+                                if col == column and tid == target_id)
+                    self.start()
+                    return state[1], stored_count + delta
+            # Not buffered yet (or just flushed): read the stored state outside the lock
+            target = getattr(Likes, column)
+            with self.flushing:
+                stored = db.session.scalar(select(Likes.id).where(Likes.author_id == author_id, target == target_id)) is not None
+
+    def start(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, daemon=True)
+            self.worker.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self.flushing:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            # Toggles that cancelled out never reach the database
+            changes = {}
+            for (column, target_id, author_id), (before, now) in pending.items():
+                if before != now:
+                    changes.setdefault(column, ([], []))[0 if now else 1].append((author_id, target_id))
+            if not changes:
+                return
+            with self.app.app_context():
+                try:
+                    for column, (likes, unlikes) in changes.items():
+                        likes = existing_pairs(column, likes) if likes else likes
+                        self.on_flush(column, add_likes(column, likes), remove_likes(column, unlikes))
+                    db.session.commit()
+                except Exception as error:
+                    db.session.rollback()
+                    self.requeue(pending, error)
+                else:
+                    with self.lock:
+                        for key in pending:
+                            self.failures.pop(key, None)
+                finally:
+                    db.session.remove()
+
+    def requeue(self, pending, error):
+        # Clients were already shown these toggles, so a failed batch goes back into the buffer for
+        # the next flush. Runs while `flushing` is held, so no toggle has re-read the stored state yet.
+        dropped = []
+        with self.lock:
+            for key, state in pending.items():
+                self.failures[key] += 1
+                if self.failures[key] >= FLUSH_ATTEMPTS:
+                    del self.failures[key]
+                    dropped.append(key)
+                else:
+                    self.pending.setdefault(key, state)
+        if dropped:
+            self.app.logger.error("Like flush failed %d times in a row, %d toggles dropped: %s", FLUSH_ATTEMPTS, len(dropped), error)
+        if len(dropped) < len(pending):
+            self.app.logger.warning("Like flush failed, %d toggles kept for the next flush: %s", len(pending) - len(dropped), error)
+
+    def shutdown(self):
+        self.flush()
@@ -0,0 +1,46 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models import BlogPost, Comments, Likes, Notifications, User
+
+
+# Relationships each view's templates touch, loaded up front so Jinja never lazy-loads per row
+PROFILES = {
+    "feed": (
+        joinedload(BlogPost.author),
+        # The "liked by" list only shows a name and an avatar built from the stored hash
+        selectinload(BlogPost.likes).joinedload(Likes.author).load_only(User.id, User.name, User.email_hash),
+    ),
+    "post_page": (
+        joinedload(BlogPost.author),
+        selectinload(BlogPost.comments).joinedload(Comments.author),
+    ),
+    "search": (
+        joinedload(BlogPost.author),
+    ),
+    "profile": (
+        joinedload(BlogPost.author),
+    ),
+    "inbox": (
+        joinedload(Notifications.sender),
+        joinedload(Notifications.post),
+        joinedload(Notifications.comment),
+    ),
+}
+
+
+def load_options(profile):
+    return PROFILES[profile]
+
+
+# Upper bound on SELECTs per request for each route, independent of how many
+# posts, likes or comments exist. Checked by `flask check-query-counts`.
+# Routes behind @conditional spend one extra query on their ETag validator,
+# which is all a revalidation that ends in 304 costs.
+QUERY_BUDGETS = {
+    "home": 4,
+    "load_posts": 5,
+    "post_page": 5,
+    "search": 6,
+    "my_posts": 5,
+    # Matching users, one page of them, their activity counts and (once per ADMIN_TOTALS_TTL) the totals
+    "admin_dashboard": 5,
+}
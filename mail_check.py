@@ -0,0 +1,72 @@
+import smtplib
+from datetime import datetime
+from sqlalchemy import delete, update
+from database import db
+from models import OutboxEmail
+from mailer import deliver_batch, backoff, MAX_ATTEMPTS
+
+
+class ScriptedSMTP:
+    # Stands in for SMTPConnection: each send() raises the next scripted error, and delivers
+    # once the script is used up
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.sent = []
+        self.closed = 0
+
+    def send(self, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(message)
+
+    def close(self):
+        self.closed += 1
+
+
+def disconnected():
+    return smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+
+# name -> (errors before the server accepts the message, final status, final attempts)
+SCENARIOS = {
+    "transient error, then delivered": ([disconnected()], "sent", 2),
+    "permanent 5xx": ([smtplib.SMTPDataError(554, b"Message rejected")], "failed", 1),
+    "refused recipient": ([smtplib.SMTPRecipientsRefused({"check@example.com": (550, b"No such user")})], "failed", 1),
+    "retries exhausted": ([disconnected() for _ in range(MAX_ATTEMPTS)], "failed", MAX_ATTEMPTS),
+}
+
+
+def check_retries(sender="noreply@localhost"):
+    # Yields (scenario, status, attempts, problems). Each scenario sends one outbox row through
+    # deliver_batch. After a failed attempt the row must still be pending, keep its error, and
+    # be pushed back by at least backoff(attempts); it is then made due again, as if that wait
+    # had passed.
+    for name, (errors, status, attempts) in SCENARIOS.items():
+        db.session.execute(delete(OutboxEmail))
+        email = OutboxEmail(receiver="check@example.com", subject=name, body="Retry check")
+        db.session.add(email)
+        db.session.commit()
+        email_id = email.id
+        smtp = ScriptedSMTP(errors)
+        problems = []
+        for _ in range(MAX_ATTEMPTS + 1):
+            started = datetime.utcnow()
+            deliver_batch(smtp, sender)
+            email = db.session.get(OutboxEmail, email_id)
+            if email.status != "pending":
+                break
+            if email.next_attempt_at < started + backoff(email.attempts):
+                problems.append(f"attempt {email.attempts} rescheduled before its backoff")
+            if not email.last_error:
+                problems.append(f"attempt {email.attempts} recorded no error")
+            db.session.execute(update(OutboxEmail).where(OutboxEmail.id == email_id).values(next_attempt_at=datetime.utcnow()))
+            db.session.commit()
+        if email.status != status:
+            problems.append(f"expected {status}")
+        if email.attempts != attempts:
+            problems.append(f"expected {attempts} attempts")
+        if status == "sent" and (email.sent_at is None or email.last_error or len(smtp.sent) != 1):
+            problems.append("delivery not recorded")
+        if status == "failed" and (not email.last_error or smtp.sent):
+            problems.append("failure not recorded")
+        yield name, email.status, email.attempts, problems
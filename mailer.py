@@ -0,0 +1,165 @@
+import os
+import smtplib
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from sqlalchemy import select, update
+from database import db
+from models import OutboxEmail
+
+
+MAX_ATTEMPTS = 6
+# A claimed message is retried after this long if its worker died mid-send
+LEASE = timedelta(minutes=10)
+
+
+def enqueue_email(receiver, subject, body, reply_to=None):
+    # Joins the caller's transaction: the mail only goes out if the change it reports commits
+    db.session.add(OutboxEmail(receiver=receiver, subject=subject, body=body, reply_to=reply_to))
+
+
+def enqueue_emails(messages):
+    # [(receiver, subject, body)] as one multi-row INSERT, in the caller's transaction like enqueue_email
+    if messages:
+        db.session.execute(OutboxEmail.__table__.insert(),
+                           [{"receiver": receiver, "subject": subject, "body": body} for receiver, subject, body in messages])
+
+
+def email_notification(receiver,sub,msg):
+    enqueue_email(receiver, sub, msg)
+    db.session.commit()
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(30 * 2 ** (attempts - 1), 3600))
+
+
+class SMTPConnection:
+    # Keeps one authenticated connection open across messages instead of
+    # paying connect + STARTTLS + login for every mail.
+    def __init__(self, host, port, user=None, password=None, use_tls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.connection = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            host=os.getenv('EMAIL_HOST', 'localhost'),
+            port=int(os.getenv('EMAIL_PORT', 587)),
+            user=os.getenv('EMAIL_USER'),
+            password=os.getenv('EMAIL_PASSWORD'),
+            use_tls=os.getenv('EMAIL_USE_TLS', '1') != '0',
+        )
+
+    def open(self):
+        if self.connection is not None:
+            try:
+                if self.connection.noop()[0] == 250:
+                    return self.connection
+            except smtplib.SMTPException:
+                pass
+            self.close()
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.user:
+            connection.login(user=self.user, password=self.password)
+        self.connection = connection
+        return connection
+
+    def send(self, message):
+        self.open().send_message(message)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+
+
+def build_message(email, sender):
+    message = EmailMessage()
+    message["Subject"] = email.subject
+    message["From"] = sender
+    message["To"] = email.receiver
+    if email.reply_to:
+        message["Reply-To"] = email.reply_to
+    message.set_content(email.body)
+    return message
+
+
+def claim_batch(batch_size):
+    now = datetime.utcnow()
+    due = db.session.execute(
+        select(OutboxEmail.id, OutboxEmail.attempts)
+        .where(OutboxEmail.status == "pending", OutboxEmail.next_attempt_at <= now)
+        .order_by(OutboxEmail.next_attempt_at, OutboxEmail.id)
+        .limit(batch_size)
+    ).all()
+    claimed = []
+    for email_id, attempts in due:
+        # attempts doubles as an optimistic lock so two workers never send the same row
+        result = db.session.execute(
+            update(OutboxEmail)
+            .where(OutboxEmail.id == email_id, OutboxEmail.attempts == attempts, OutboxEmail.status == "pending")
+            .values(attempts=attempts + 1, next_attempt_at=now + LEASE),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount == 1:
+            claimed.append(email_id)
+    db.session.commit()
+    return db.session.scalars(select(OutboxEmail).where(OutboxEmail.id.in_(claimed)).order_by(OutboxEmail.id)).all()
+
+
+def deliver_batch(smtp, sender, batch_size=50):
+    emails = claim_batch(batch_size)
+    for email in emails:
+        try:
+            smtp.send(build_message(email, sender))
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as error:
+            permanent = getattr(error, "smtp_code", 0) >= 500 or isinstance(error, smtplib.SMTPRecipientsRefused)
+            record_failure(email, error, permanent)
+        except (smtplib.SMTPException, OSError) as error:
+            smtp.close()
+            record_failure(email, error, permanent=False)
+        except Exception as error:
+            # A malformed message must not take the worker down with it
+            record_failure(email, error, permanent=True)
+        else:
+            email.status = "sent"
+            email.sent_at = datetime.utcnow()
+            email.last_error = None
+    db.session.commit()
+    return len(emails)
+
+
+def record_failure(email, error, permanent):
+    email.last_error = str(error)[:500]
+    if permanent or email.attempts >= MAX_ATTEMPTS:
+        email.status = "failed"
+    else:
+        email.next_attempt_at = datetime.utcnow() + backoff(email.attempts)
+
+
+def run_worker(batch_size=50, interval=5, once=False):
+    smtp = SMTPConnection.from_env()
+    sender = os.getenv('EMAIL_USER') or 'noreply@localhost'
+    try:
+        while True:
+            sent = deliver_batch(smtp, sender, batch_size)
+            if once and not sent:
+                return
+            if not sent:
+                # Nothing due: drop the connection rather than hold it idle, then poll again
+                smtp.close()
+                db.session.remove()
+                time.sleep(interval)
+    finally:
+        smtp.close()
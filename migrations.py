@@ -0,0 +1,214 @@
+import re
+from sqlalchemy import inspect, text, bindparam, select, literal_column
+from sqlalchemy.schema import CreateTable, AddConstraint
+from database import db
+
+
+MIGRATIONS = []
+
+
+def migration(version):
+    def register(fun):
+        MIGRATIONS.append((version, fun))
+        return fun
+    return register
+
+
+def column_names(table):
+    return [column["name"] for column in inspect(db.session.connection()).get_columns(table)]
+
+
+def add_column(table, name, ddl):
+    if name not in column_names(table):
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def create_index(model, name):
+    index = next(index for index in model.__table__.indexes if index.name == name)
+    # An index over a column that a later migration adds is created by that migration
+    if all(column.name in column_names(model.__tablename__) for column in index.columns):
+        index.create(db.session.connection(), checkfirst=True)
+
+
+def current_version():
+    db.session.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    return db.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def upgrade():
+    current = current_version()
+    for version, fun in sorted(MIGRATIONS):
+        if version <= current:
+            continue
+        fun()
+        db.session.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+        db.session.commit()
+        print(f"Applied migration {version}: {fun.__name__}")
+
+
+@migration(1)
+def add_like_and_comment_counters():
+    from counters import repair_counters
+    add_column("blog_post", "like_count", "INTEGER NOT NULL DEFAULT 0")
+    add_column("blog_post", "comment_count", "INTEGER NOT NULL DEFAULT 0")
+    add_column("comments", "like_count", "INTEGER NOT NULL DEFAULT 0")
+    # repair_counters() also writes the stamps added in migrations 6 and 7
+    add_stamp_columns()
+    repair_counters()
+
+
+@migration(2)
+def index_likes_by_author():
+    # Superseded by the unique indexes of migration 5
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_likes_author_post ON likes (author_id, post_id)"))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_likes_author_comment ON likes (author_id, comment_id)"))
+
+
+@migration(3)
+def create_search_index():
+    from search import rebuild_index
+    rebuild_index()
+
+
+@migration(4)
+def add_unread_notification_counter():
+    from counters import repair_unread_counts
+    add_column("user", "unread_count", "INTEGER NOT NULL DEFAULT 0")
+    repair_unread_counts()
+
+
+@migration(5)
+def add_access_path_indexes():
+    from models import BlogPost, Comments, Likes, Notifications
+    from counters import repair_counters
+    # Double clicks used to store the same like twice; keep the oldest before enforcing uniqueness
+    for column in ("post_id", "comment_id"):
+        db.session.execute(text(
+            f"DELETE FROM likes WHERE {column} IS NOT NULL AND id NOT IN "
+            f"(SELECT MIN(id) FROM likes WHERE {column} IS NOT NULL GROUP BY author_id, {column})"
+        ))
+    add_stamp_columns()
+    repair_counters()
+    db.session.execute(text("DROP INDEX IF EXISTS ix_likes_author_post"))
+    db.session.execute(text("DROP INDEX IF EXISTS ix_likes_author_comment"))
+    for model in (BlogPost, Comments, Likes, Notifications):
+        for index in model.__table__.indexes:
+            create_index(model, index.name)
+
+
+@migration(6)
+def add_fragment_versions():
+    add_column("blog_post", "version", "INTEGER NOT NULL DEFAULT 0")
+    add_column("comments", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(7)
+def add_post_updated_at():
+    from datetime import datetime
+    from models import BlogPost
+    add_stamp_columns()
+    db.session.execute(BlogPost.__table__.update().values(updated_at=datetime.utcnow()))
+    create_index(BlogPost, "ix_blog_post_updated")
+
+
+@migration(8)
+def convert_post_date_to_datetime():
+    from datetime import datetime
+    from models import BlogPost
+    if "date" in column_names("blog_post"):
+        add_column("blog_post", "created_at", "DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00'")
+        table = BlogPost.__table__
+        rows = db.session.execute(select(table.c.id, literal_column("date"), table.c.updated_at)).all()
+        created = []
+        for post_id, date, updated_at in rows:
+            try:
+                created_at = datetime.strptime(date, "%B %d, %Y")
+            except (TypeError, ValueError):
+                # Unparseable legacy value: the post is at least as old as its last change
+                created_at = updated_at
+            created.append({"post_id": post_id, "created_at": created_at})
+        if created:
+            db.session.execute(table.update().where(table.c.id == bindparam("post_id"))
+                               .values(created_at=bindparam("created_at")), created)
+        db.session.execute(text("ALTER TABLE blog_post DROP COLUMN date"))
+    # ix_blog_post_author gained created_at so profile pages read posts newest-first straight off the index
+    db.session.execute(text("DROP INDEX IF EXISTS ix_blog_post_author"))
+    create_index(BlogPost, "ix_blog_post_author")
+    create_index(BlogPost, "ix_blog_post_created")
+
+
+@migration(9)
+def add_email_hashes():
+    from avatars import email_hash
+    from models import User
+    add_column("user", "email_hash", "VARCHAR(32)")
+    table = User.__table__
+    rows = db.session.execute(select(table.c.id, table.c.email)).all()
+    hashes = [{"user_id": user_id, "email_hash": email_hash(email)} for user_id, email in rows if email]
+    if hashes:
+        db.session.execute(table.update().where(table.c.id == bindparam("user_id"))
+                           .values(email_hash=bindparam("email_hash")), hashes)
+
+
+def add_stamp_columns():
+    add_fragment_versions()
+    add_column("blog_post", "updated_at", "DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00'")
+
+
+@migration(10)
+def add_delete_cascades():
+    from models import BlogPost, Comments, Likes, Notifications
+    from counters import repair_counters, repair_unread_counts
+    add_column("user", "pending_deletion", "BOOLEAN NOT NULL DEFAULT 0")
+    # Parents before children, so each table is rebuilt after the ones it references
+    models = (BlogPost, Comments, Likes, Notifications)
+    if db.engine.dialect.name != "sqlite":
+        connection = db.session.connection()
+        quote = connection.dialect.identifier_preparer.quote
+        for model in models:
+            table = model.__table__
+            reflected = {tuple(fk["constrained_columns"]): fk["name"] for fk in inspect(connection).get_foreign_keys(table.name)}
+            for constraint in table.foreign_key_constraints:
+                name = reflected.get(tuple(constraint.column_keys))
+                if name:
+                    db.session.execute(text(f"ALTER TABLE {quote(table.name)} DROP CONSTRAINT {quote(name)}"))
+                db.session.execute(AddConstraint(constraint))
+        return
+    # SQLite can not alter a foreign key. Each table is recreated from the model's DDL, copied
+    # and swapped in on one connection with enforcement off, so dropping the old tables cascades
+    # nowhere. The pragma is ignored inside a transaction, hence the commit first.
+    db.session.commit()
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        try:
+            if connection.exec_driver_sql("PRAGMA foreign_keys").scalar():
+                raise RuntimeError("Could not turn off foreign key enforcement to rebuild the tables.")
+            for model in models:
+                table = model.__table__
+                existing = [column["name"] for column in inspect(connection).get_columns(table.name)]
+                columns = ", ".join(column for column in existing if column in table.c)
+                ddl = re.sub(rf"CREATE TABLE {table.name} \(", f"CREATE TABLE {table.name}_rebuild (",
+                             str(CreateTable(table).compile(connection)), count=1)
+                connection.execute(text(ddl))
+                connection.execute(text(f"INSERT INTO {table.name}_rebuild ({columns}) SELECT {columns} FROM {table.name}"))
+                connection.execute(text(f"DROP TABLE {table.name}"))
+                connection.execute(text(f"ALTER TABLE {table.name}_rebuild RENAME TO {table.name}"))
+                for index in table.indexes:
+                    index.create(connection)
+            # Rows whose parent was deleted while nothing enforced the keys; deleting an orphaned
+            # comment orphans its likes, so check again until nothing is left
+            orphaned = False
+            while violations := connection.exec_driver_sql("PRAGMA foreign_key_check").all():
+                orphaned = True
+                rows = {}
+                for table_name, rowid, _, _ in violations:
+                    rows.setdefault(table_name, set()).add(rowid)
+                for table_name, rowids in rows.items():
+                    connection.execute(text(f"DELETE FROM {table_name} WHERE rowid IN :rowids")
+                                       .bindparams(bindparam("rowids", expanding=True)), {"rowids": sorted(rowids)})
+            connection.commit()
+        finally:
+            connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+    if orphaned:
+        repair_counters()
+        repair_unread_counts()
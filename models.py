@@ -1,21 +1,30 @@
-from sqlalchemy import Integer, String, ForeignKey,DateTime,Boolean
+from sqlalchemy import Integer, String, ForeignKey,DateTime,Boolean,Index
 from flask_login import UserMixin
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from avatars import email_hash
 from database import db
 from datetime import datetime
 
 
 class Notifications(db.Model):
+    __table_args__ = (
+        Index("ix_notifications_receiver_time", "receiver_id", "timestamp", "id"),
+        Index("ix_notifications_receiver_unread", "receiver_id", "is_read"),
+        Index("ix_notifications_dedupe", "receiver_id", "sender_id", "post_id", "comment_id"),
+        Index("ix_notifications_sender", "sender_id"),
+        Index("ix_notifications_post", "post_id"),
+        Index("ix_notifications_comment", "comment_id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     type: Mapped[str] = mapped_column(String,nullable=False)
     message:Mapped[str] = mapped_column(String,nullable=False)
     is_read: Mapped[bool] = mapped_column(Boolean,default=False)
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    receiver_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id"))
-    sender_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id"))
-    post_id: Mapped[int] = mapped_column(Integer,ForeignKey("blog_post.id"),nullable=True)
-    comment_id: Mapped[int] = mapped_column(Integer,ForeignKey("comments.id"),nullable=True)
+    receiver_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id",ondelete="CASCADE"))
+    sender_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id",ondelete="CASCADE"))
+    post_id: Mapped[int] = mapped_column(Integer,ForeignKey("blog_post.id",ondelete="CASCADE"),nullable=True)
+    comment_id: Mapped[int] = mapped_column(Integer,ForeignKey("comments.id",ondelete="CASCADE"),nullable=True)
 
     receiver = relationship("User",back_populates="notifications",foreign_keys=[receiver_id])
     sender = relationship("User",back_populates="sent_notifications",foreign_keys=[sender_id])
@@ -26,16 +35,25 @@ class Notifications(db.Model):
 class User(db.Model, UserMixin):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     email: Mapped[str] = mapped_column(String, unique=True)
+    email_hash: Mapped[str] = mapped_column(String(32), nullable=True)
     password: Mapped[str] = mapped_column(String)
     name: Mapped[str] = mapped_column(String)
     is_admin: Mapped[bool] = mapped_column(Boolean,default=False)
     is_restricted: Mapped[bool] = mapped_column(Boolean,default=False)
+    unread_count: Mapped[int] = mapped_column(Integer,nullable=False,default=0,server_default="0")
+    # Set when the account is removed; the deletion worker deletes its rows and then the user
+    pending_deletion: Mapped[bool] = mapped_column(Boolean,nullable=False,default=False,server_default="0")
 
-    posts = relationship("BlogPost",back_populates="author",cascade="all, delete-orphan")
-    comments = relationship("Comments",back_populates="author",cascade="all, delete-orphan")
-    likes = relationship("Likes",back_populates="author",cascade="all, delete-orphan")
-    notifications = relationship("Notifications",back_populates="receiver",cascade="all, delete-orphan",foreign_keys=[Notifications.receiver_id])
-    sent_notifications = relationship("Notifications",back_populates="sender",cascade="all, delete-orphan",foreign_keys=[Notifications.sender_id])
+    posts = relationship("BlogPost",back_populates="author",cascade="all, delete-orphan",passive_deletes=True)
+    comments = relationship("Comments",back_populates="author",cascade="all, delete-orphan",passive_deletes=True)
+    likes = relationship("Likes",back_populates="author",cascade="all, delete-orphan",passive_deletes=True)
+    notifications = relationship("Notifications",back_populates="receiver",cascade="all, delete-orphan",passive_deletes=True,foreign_keys=[Notifications.receiver_id])
+    sent_notifications = relationship("Notifications",back_populates="sender",cascade="all, delete-orphan",passive_deletes=True,foreign_keys=[Notifications.sender_id])
+
+    @validates("email")
+    def hash_email(self, key, email):
+        self.email_hash = email_hash(email) if email else None
+        return email
 
     @property
     def is_super_admin(self):
@@ -48,40 +66,63 @@ class User(db.Model, UserMixin):
 
 class BlogPost(db.Model):
     __tablename__ = "blog_post"
+    __table_args__ = (
+        Index("ix_blog_post_author", "author_id", "created_at"),
+        Index("ix_blog_post_created", "created_at"),
+        Index("ix_blog_post_updated", "updated_at"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    author_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id"))
+    author_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id",ondelete="CASCADE"))
     title: Mapped[str] = mapped_column(String,nullable=False,unique=True)
     subtitle: Mapped[str] = mapped_column(String,nullable=False)
-    date: Mapped[str] = mapped_column(String,nullable=False)
     body: Mapped[str] = mapped_column(String,nullable=False)
     img_url: Mapped[str] = mapped_column(String,nullable=False)
+    like_count: Mapped[int] = mapped_column(Integer,nullable=False,default=0,server_default="0")
+    comment_count: Mapped[int] = mapped_column(Integer,nullable=False,default=0,server_default="0")
+    # Bumped whenever anything rendered from this row changes; keys its cached fragments
+    version: Mapped[int] = mapped_column(Integer,nullable=False,default=0,server_default="0")
+    created_at: Mapped[datetime] = mapped_column(DateTime,nullable=False,default=datetime.utcnow)
+    # Last change to anything shown on the post page, comments and likes included
+    updated_at: Mapped[datetime] = mapped_column(DateTime,nullable=False,default=datetime.utcnow)
 
     author = relationship("User", back_populates="posts")
-    comments = relationship("Comments", back_populates="post", cascade="all, delete-orphan")
-    likes = relationship("Likes",back_populates="post",cascade="all, delete-orphan")
-    notifications = relationship("Notifications",back_populates="post",cascade="all, delete-orphan")
+    comments = relationship("Comments", back_populates="post", cascade="all, delete-orphan",passive_deletes=True)
+    likes = relationship("Likes",back_populates="post",cascade="all, delete-orphan",passive_deletes=True)
+    notifications = relationship("Notifications",back_populates="post",cascade="all, delete-orphan",passive_deletes=True)
 
 
 
 class Comments(db.Model):
+    __table_args__ = (
+        Index("ix_comments_post", "post_id", "date"),
+        Index("ix_comments_author", "author_id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    author_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id"))
-    post_id: Mapped[int] = mapped_column(Integer, ForeignKey("blog_post.id"))
+    author_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id",ondelete="CASCADE"))
+    post_id: Mapped[int] = mapped_column(Integer, ForeignKey("blog_post.id",ondelete="CASCADE"))
     text: Mapped[str] = mapped_column(String, nullable=False)
     date: Mapped[datetime] = mapped_column(DateTime,default=datetime.utcnow)
     edited = db.Column(db.Boolean, default=False)
+    like_count: Mapped[int] = mapped_column(Integer,nullable=False,default=0,server_default="0")
+    version: Mapped[int] = mapped_column(Integer,nullable=False,default=0,server_default="0")
 
     author = relationship("User",back_populates="comments")
     post = relationship("BlogPost",back_populates="comments")
-    likes = relationship("Likes",back_populates="comment",cascade="all, delete-orphan")
-    notifications = relationship("Notifications",back_populates="comment",cascade="all, delete-orphan")
+    likes = relationship("Likes",back_populates="comment",cascade="all, delete-orphan",passive_deletes=True)
+    notifications = relationship("Notifications",back_populates="comment",cascade="all, delete-orphan",passive_deletes=True)
 
 
 class Likes(db.Model):
+    __table_args__ = (
+        Index("uq_likes_author_post", "author_id", "post_id", unique=True),
+        Index("uq_likes_author_comment", "author_id", "comment_id", unique=True),
+        Index("ix_likes_post", "post_id"),
+        Index("ix_likes_comment", "comment_id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    author_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id"))
-    post_id: Mapped[int] = mapped_column(Integer,ForeignKey("blog_post.id"),nullable=True)
-    comment_id: Mapped[int] = mapped_column(Integer, ForeignKey("comments.id"), nullable=True)
+    author_id: Mapped[int] = mapped_column(Integer,ForeignKey("user.id",ondelete="CASCADE"))
+    post_id: Mapped[int] = mapped_column(Integer,ForeignKey("blog_post.id",ondelete="CASCADE"),nullable=True)
+    comment_id: Mapped[int] = mapped_column(Integer, ForeignKey("comments.id",ondelete="CASCADE"), nullable=True)
 
     author = relationship("User",back_populates="likes")
     post = relationship("BlogPost",back_populates="likes")
@@ -89,3 +130,39 @@ class Likes(db.Model):
 
 
 
+
+
+class OutboxEmail(db.Model):
+    __tablename__ = "outbox_email"
+    __table_args__ = (
+        Index("ix_outbox_email_due", "status", "next_attempt_at"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    receiver: Mapped[str] = mapped_column(String,nullable=False)
+    subject: Mapped[str] = mapped_column(String,nullable=False)
+    body: Mapped[str] = mapped_column(String,nullable=False)
+    reply_to: Mapped[str] = mapped_column(String,nullable=True)
+    status: Mapped[str] = mapped_column(String,nullable=False,default="pending")
+    attempts: Mapped[int] = mapped_column(Integer,nullable=False,default=0)
+    last_error: Mapped[str] = mapped_column(String,nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime,default=datetime.utcnow)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime,default=datetime.utcnow)
+    sent_at: Mapped[datetime] = mapped_column(DateTime,nullable=True)
+
+
+class AccountDeletion(db.Model):
+    __tablename__ = "account_deletion"
+    __table_args__ = (
+        Index("ix_account_deletion_queue", "finished_at", "requested_at"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # No foreign key: the record outlives the user it describes
+    user_id: Mapped[int] = mapped_column(Integer,nullable=False)
+    name: Mapped[str] = mapped_column(String,nullable=True)
+    email: Mapped[str] = mapped_column(String,nullable=True)
+    requested_by: Mapped[int] = mapped_column(Integer,nullable=True)
+    requested_at: Mapped[datetime] = mapped_column(DateTime,default=datetime.utcnow)
+    # The table the worker is deleting from, and how many rows it has deleted so far
+    step: Mapped[str] = mapped_column(String,nullable=False,default="pending")
+    deleted_rows: Mapped[int] = mapped_column(Integer,nullable=False,default=0)
+    finished_at: Mapped[datetime] = mapped_column(DateTime,nullable=True)
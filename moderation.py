@@ -0,0 +1,138 @@
+from sqlalchemy import select, update
+from database import db
+from models import User, Notifications
+from counters import bump_counters
+from deletion import schedule_deletions
+from mailer import enqueue_emails
+from pubsub import queue_event
+from user_cache import forget_user
+
+
+# Most users one bulk request may touch; the dashboard pages 50 at a time
+MAX_BULK_USERS = 500
+
+# action -> column changes, whether only the super admin may use it, the in-app notification
+# (type, message) and the email (subject, body). Messages are formatted with the user's name.
+ACTIONS = {
+    "promote": {
+        "values": {"is_admin": True},
+        "super_admin_only": True,
+        "notification": ("Promotion", "Hello {name}, your account has been promoted to a higher role with additional privileges."),
+        "email": ("You've Been Promoted!", """Hello {name},
+
+Congratulations! Your account has been promoted to a higher role on our platform.
+You now have additional privileges and access to new features. Please use them responsibly and continue contributing positively to the community.
+
+Best regards,
+The Team"""),
+    },
+    "demote": {
+        "values": {"is_admin": False},
+        "super_admin_only": True,
+        "notification": ("Demotion", "Hello {name}, your account role has been updated and some previous privileges may no longer be available."),
+        "email": ("Your Account Role Has Been Updated", """Hello {name},
+
+We wanted to let you know that your account role has been changed.
+Some of your previous privileges may no longer be available. If you believe this change was made in error, please contact us through the contact page.
+
+Best regards,
+The Team"""),
+    },
+    "restrict": {
+        "values": {"is_restricted": True},
+        "super_admin_only": False,
+        "notification": ("Restriction", "Hello {name}, your account has been temporarily restricted due to a policy violation."),
+        "email": ("Your Account Has Been Restricted", """Hello {name},
+
+Your account has been temporarily restricted due to policy violations or unusual activity.
+
+You won't be able to access certain features until this restriction is lifted. If you think this was a mistake, please reach out to us through the contact page.
+
+Thank you for your understanding,
+The Team"""),
+    },
+    "unrestrict": {
+        "values": {"is_restricted": False},
+        "super_admin_only": False,
+        "notification": ("Restriction Lifted", "Hello {name}, your account restrictions have been removed. You now have full access to all features again."),
+        "email": ("Your Account Access Has Been Restored", """Hello {name},
+
+Good news! Your account restriction has been lifted, and you now have full access to your account again.
+
+Thank you for your patience and understanding.
+
+Best regards,
+The Team"""),
+    },
+    "remove": {
+        # Only marks the account; the deletion worker removes its rows in chunks and sends the email
+        "values": {"pending_deletion": True},
+        "super_admin_only": False,
+        "notification": None,
+        "email": None,
+    },
+}
+
+
+def refusal(action, actor, user):
+    # The permission rules shared by the single-user routes and the bulk endpoint: admins can
+    # act on regular users, only the super admin can act on admins, and nobody removes the super admin
+    if ACTIONS[action]["super_admin_only"] and not actor.is_super_admin:
+        return f"Only the super admin can {action} users."
+    if action == "remove" and user.is_super_admin:
+        return "The super admin can not be removed."
+    if user.pending_deletion and action != "remove":
+        return "This account is being deleted."
+    # admin_privileges: the super admin (id 1) need not have is_admin set
+    if user.admin_privileges and not actor.is_super_admin:
+        return f"You can not {action} admins!!"
+    return None
+
+
+def unchanged(action, user):
+    return all(getattr(user, column) == value for column, value in ACTIONS[action]["values"].items())
+
+
+def moderate(action, user_ids, actor):
+    # Applies one action to many users in a single transaction and returns a per-user report:
+    # [{"user_id", "name", "email", "status": done | unchanged | refused | missing, "reason"}].
+    # Changes, notifications and emails are each written with one statement, not one per user.
+    spec = ACTIONS[action]
+    user_ids = list(dict.fromkeys(user_ids))
+    users = {user.id: user for user in db.session.scalars(select(User).where(User.id.in_(user_ids)))}
+    report, targets = [], []
+    for user_id in user_ids:
+        user = users.get(user_id)
+        outcome = {"user_id": user_id, "name": user and user.name, "email": user and user.email, "reason": None}
+        if user is None:
+            outcome["status"] = "missing"
+        elif reason := refusal(action, actor, user):
+            outcome.update(status="refused", reason=reason)
+        elif unchanged(action, user):
+            outcome["status"] = "unchanged"
+        else:
+            outcome["status"] = "done"
+            targets.append(user)
+        report.append(outcome)
+    if not targets:
+        return report
+
+    target_ids = [user.id for user in targets]
+    db.session.execute(update(User).where(User.id.in_(target_ids)).values(spec["values"]))
+    for user_id in target_ids:
+        forget_user(user_id)
+    if action == "remove":
+        schedule_deletions(targets, actor)
+    if spec["notification"] is not None:
+        type, message = spec["notification"]
+        insert = Notifications.__table__.insert().returning(Notifications.id, Notifications.receiver_id)
+        created = db.session.execute(insert, [{"type": type, "message": message.format(name=user.name),
+                                               "receiver_id": user.id, "sender_id": actor.id} for user in targets]).all()
+        bump_counters(User, target_ids, "unread_count", 1)
+        for notification_id, receiver_id in created:
+            queue_event(receiver_id, notification_id)
+    if spec["email"] is not None:
+        subject, body = spec["email"]
+        enqueue_emails([(user.email, subject, body.format(name=user.name)) for user in targets])
+    db.session.commit()
+    return report
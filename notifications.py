@@ -0,0 +1,44 @@
+from flask import Blueprint,render_template,request,abort,jsonify,Response,stream_with_context
+from flask_login import current_user,login_required
+from database import db
+from inbox import inbox_page,mark_read,decode_cursor
+from pubsub import event_stream
+
+
+bp = Blueprint("notifications", __name__)
+
+
+@bp.route("/notifications")
+@login_required
+def notifications():
+    unread_count = current_user.unread_count
+    show_notifications, next_cursor = inbox_page(current_user.id)
+    mark_read(current_user.id, show_notifications)
+    # Render before committing: the commit expires the rows and they would all reload as read
+    html = render_template("notifications.html",show_notifications=show_notifications,
+                           next_cursor=next_cursor,unread_count=unread_count)
+    db.session.commit()
+    return html
+
+
+@bp.route("/notifications/older")
+@login_required
+def older_notifications():
+    before = decode_cursor(request.args.get("before"))
+    if before is None:
+        return abort(400)
+    show_notifications, next_cursor = inbox_page(current_user.id, before)
+    mark_read(current_user.id, show_notifications)
+    html = render_template("notification_items.html",show_notifications=show_notifications)
+    db.session.commit()
+    return jsonify(html=html, next=next_cursor)
+
+
+@bp.route("/notifications/stream")
+@login_required
+def notification_stream():
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return Response(stream_with_context(event_stream(current_user.id, last_event_id)),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
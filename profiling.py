@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+from contextlib import contextmanager
+from sqlalchemy import event
+from database import db
+
+
+@contextmanager
+def count_queries(engine=None):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = engine or db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+# Seconds for `import main` plus create_app() in a fresh interpreter, and modules that must never be
+# pulled in on the way (test machinery, drivers for databases we don't run). Checked by `flask check-import-time`.
+STARTUP_BUDGET = 0.8
+FORBIDDEN_MODULES = ("sqlalchemy.testing", "sqlalchemy.dialects.postgresql", "pytest")
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app()
+done = time.perf_counter()
+print(json.dumps({"import": imported - started, "create_app": done - imported, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_startup(root):
+    # The database URI points into a directory that doesn't exist, so anything that
+    # connects while importing or building the app fails the run instead of passing quietly
+    env = dict(os.environ, DATABASE_URI="sqlite:////nonexistent/startup-check.db", TEMPLATE_WARM_UP="0")
+    result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=root, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
@@ -0,0 +1,193 @@
+import json
+import queue
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from werkzeug.utils import import_string
+from database import db
+from models import Notifications, User
+
+
+HEARTBEAT_SECONDS = 20
+REPLAY_LIMIT = 50
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.events = queue.Queue(maxsize=100)
+
+    def get(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    # Fans events out to the SSE streams open in this process. With several
+    # workers a publisher only reaches its own process, so multi-worker
+    # deployments should configure a shared broker instead.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, user_id, payload):
+        with self.lock:
+            targets = list(self.subscribers.get(user_id, ()))
+        for subscription in targets:
+            try:
+                subscription.events.put_nowait(payload)
+            except queue.Full:
+                # A stalled client only misses live events; it catches up through Last-Event-ID
+                pass
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self.subscribers.pop(subscription.user_id, None)
+
+
+class DatabaseSubscription:
+    def __init__(self, user_id, interval):
+        self.user_id = user_id
+        self.interval = interval
+        self.last_id = None
+        self.unread = None
+
+    def get(self, timeout):
+        # Wakes every `interval` seconds and turns new rows / a changed counter into events
+        deadline = time.monotonic() + timeout
+        while True:
+            payload = self.poll()
+            db.session.remove()
+            if payload or time.monotonic() >= deadline:
+                return payload
+            time.sleep(self.interval)
+
+    def poll(self):
+        unread = db.session.scalar(select(User.unread_count).where(User.id == self.user_id))
+        newest = db.session.scalar(select(Notifications.id).where(Notifications.receiver_id == self.user_id)
+                                   .order_by(Notifications.id.desc()).limit(1))
+        if self.last_id is None:
+            self.last_id, self.unread = newest, unread
+            return None
+        payload = None
+        if newest is not None and newest != self.last_id:
+            payload = {"notification_id": newest}
+        elif unread != self.unread:
+            payload = {}
+        self.last_id, self.unread = newest, unread
+        return payload
+
+    def close(self):
+        pass
+
+
+class DatabaseBroker:
+    # Works across any number of workers without extra infrastructure: each
+    # open stream checks two indexed columns every few seconds.
+    def __init__(self, interval=3):
+        self.interval = interval
+
+    def publish(self, user_id, payload):
+        pass
+
+    def subscribe(self, user_id):
+        return DatabaseSubscription(user_id, self.interval)
+
+
+BROKERS = {
+    "memory": InProcessBroker,
+    "database": DatabaseBroker,
+}
+
+
+def notification_broker():
+    extension = current_app.extensions
+    if "notification_broker" not in extension:
+        name = current_app.config.get("NOTIFICATION_BROKER") or "memory"
+        broker_class = BROKERS[name] if name in BROKERS else import_string(name)
+        extension["notification_broker"] = broker_class()
+    return extension["notification_broker"]
+
+
+def queue_event(user_id, notification_id=None):
+    # Held on the session and only published once the transaction commits
+    payload = {"notification_id": notification_id} if notification_id else {}
+    db.session.info.setdefault("pending_events", []).append((user_id, payload))
+
+
+@event.listens_for(Session, "after_commit")
+def publish_pending(session):
+    pending = session.info.pop("pending_events", None)
+    if pending:
+        broker = notification_broker()
+        for user_id, payload in pending:
+            broker.publish(user_id, payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_pending(session):
+    session.info.pop("pending_events", None)
+
+
+def format_event(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {name}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def notification_data(notification, unread):
+    return {"id": notification.id, "type": notification.type, "message": notification.message,
+            "timestamp": notification.timestamp.isoformat(), "unread": unread}
+
+
+def event_stream(user_id, last_event_id=None):
+    subscription = notification_broker().subscribe(user_id)
+    try:
+        yield "retry: 5000\n\n"
+        # Replay whatever was created while the client was disconnected
+        unread = db.session.scalar(select(User.unread_count).where(User.id == user_id))
+        if last_event_id is not None:
+            missed = db.session.scalars(
+                select(Notifications)
+                .where(Notifications.receiver_id == user_id, Notifications.id > last_event_id)
+                .order_by(Notifications.id).limit(REPLAY_LIMIT)
+            ).all()
+            for notification in missed:
+                yield format_event("notification", notification_data(notification, unread), notification.id)
+        yield format_event("unread", {"unread": unread})
+        db.session.remove()
+
+        while True:
+            payload = subscription.get(timeout=HEARTBEAT_SECONDS)
+            if payload is None:
+                yield ": heartbeat\n\n"
+                continue
+            unread = db.session.scalar(select(User.unread_count).where(User.id == user_id))
+            notification = db.session.get(Notifications, payload["notification_id"]) if payload.get("notification_id") else None
+            if notification is not None:
+                yield format_event("notification", notification_data(notification, unread), notification.id)
+            else:
+                yield format_event("unread", {"unread": unread})
+            db.session.remove()
+    finally:
+        subscription.close()
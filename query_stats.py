@@ -0,0 +1,128 @@
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from database import db
+
+
+# Numbers, quoted strings and IN (...) lists vary per row; everything else identifies the query
+LITERALS = re.compile(r"'(?:''|[^'])*'|\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|:\w+|%\(\w+\)s)\s*,?)+\)", re.I)
+SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    statement = LITERALS.sub("?", statement)
+    statement = IN_LIST.sub("IN (...)", statement)
+    return SPACES.sub(" ", statement).strip()
+
+
+def trigger(app_root):
+    # Where the repeated query came from: the innermost template line if a template is
+    # rendering (lazy loads in a {% for %} loop), otherwise the innermost line of our own code
+    frame, fallback = sys._getframe(2), None
+    while frame is not None:
+        template = frame.f_globals.get("__jinja_template__")
+        if template is not None:
+            return f"{template.name}:{template.get_corresponding_lineno(frame.f_lineno)}"
+        filename = frame.f_code.co_filename
+        if fallback is None and filename.startswith(app_root) and filename != __file__:
+            fallback = f"{filename[len(app_root):].lstrip('/')}:{frame.f_lineno}"
+        frame = frame.f_back
+    return fallback
+
+
+class RequestQueries:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.repeats = Counter()
+        # fingerprint -> template/line that issued it once it crossed the threshold
+        self.suspects = {}
+
+
+class QueryStats:
+    # Rolling per-route summary of sampled requests: the last `window` samples of each endpoint
+    def __init__(self, sample_rate, threshold=5, window=200):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.suspects = defaultdict(dict)
+
+    def record(self, endpoint, sample, elapsed):
+        with self.lock:
+            self.samples[endpoint].append((sample.count, sample.seconds, elapsed))
+            for statement, location in sample.suspects.items():
+                seen = self.suspects[endpoint].setdefault(statement, {"location": location, "requests": 0, "max_repeats": 0})
+                seen["location"] = location
+                seen["requests"] += 1
+                seen["max_repeats"] = max(seen["max_repeats"], sample.repeats[statement])
+
+    def summary(self):
+        with self.lock:
+            routes = []
+            for endpoint, samples in self.samples.items():
+                queries = [count for count, _, _ in samples]
+                routes.append({"endpoint": endpoint, "samples": len(samples),
+                               "queries": statistics.median(queries), "max_queries": max(queries),
+                               "db_ms": round(statistics.fmean(seconds for _, seconds, _ in samples) * 1000, 2),
+                               "total_ms": round(statistics.fmean(elapsed for _, _, elapsed in samples) * 1000, 2),
+                               "suspects": sorted(({"statement": statement, **seen} for statement, seen in self.suspects[endpoint].items()),
+                                                  key=lambda seen: -seen["max_repeats"])})
+        return sorted(routes, key=lambda route: (-len(route["suspects"]), -route["max_queries"]))
+
+
+def install_query_stats(app):
+    # With SQL_SAMPLE_RATE at 0 nothing is hooked at all, neither the engine events nor the request hooks
+    sample_rate = app.config.get("SQL_SAMPLE_RATE", 0)
+    if sample_rate <= 0:
+        return
+    stats = app.extensions["query_stats"] = QueryStats(sample_rate, app.config.get("SQL_N_PLUS_ONE_THRESHOLD", 5))
+    app_root = app.root_path
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and "sql_sample" in g:
+            conn.info.setdefault("sql_sample_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("sql_sample_started")
+        if not started or not has_request_context() or "sql_sample" not in g:
+            return
+        sample = g.sql_sample
+        sample.seconds += time.perf_counter() - started.pop()
+        sample.count += 1
+        key = fingerprint(statement)
+        sample.repeats[key] += 1
+        if sample.repeats[key] == stats.threshold:
+            sample.suspects[key] = trigger(app_root)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    @app.before_request
+    def start_sample():
+        if random.random() < stats.sample_rate:
+            g.sql_sample = RequestQueries()
+
+    @app.after_request
+    def finish_sample(response):
+        # Queries a streamed body makes after this point are not counted
+        sample = g.pop("sql_sample", None)
+        if sample is None or request.endpoint is None:
+            return response
+        elapsed = time.perf_counter() - sample.started
+        stats.record(request.endpoint, sample, elapsed)
+        timings = [f'db;dur={sample.seconds * 1000:.2f};desc="{sample.count} queries"', f"app;dur={elapsed * 1000:.2f}"]
+        if sample.suspects:
+            timings.append(f'n1;desc="{len(sample.suspects)} repeated: {", ".join(sorted(filter(None, sample.suspects.values())))}"')
+        response.headers.add("Server-Timing", ", ".join(timings))
+        return response
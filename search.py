@@ -0,0 +1,191 @@
+import html
+import re
+from flask import current_app
+from sqlalchemy import event, inspect, text, select, func, or_, bindparam
+from sqlalchemy.orm import Session
+from database import db
+from models import BlogPost, User
+from loaders import load_options
+
+
+TAG = re.compile(r"<[^>]+>")
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def plain_text(body):
+    return html.unescape(TAG.sub(" ", body or ""))
+
+
+# Backends write through the caller's connection, so index changes commit or
+# roll back together with the post change that caused them.
+class SearchBackend:
+    def setup(self, connection):
+        pass
+
+    def index_posts(self, connection, post_ids):
+        raise NotImplementedError
+
+    def remove_posts(self, connection, post_ids):
+        raise NotImplementedError
+
+    def rebuild(self, connection):
+        raise NotImplementedError
+
+    def search(self, query, offset, limit):
+        # Returns (post ids in rank order, total number of matches)
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    # Column weights for bm25(): a hit in the title or author name outranks one in the body
+    WEIGHTS = "10.0, 4.0, 1.0, 6.0"
+
+    def setup(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_search "
+            "USING fts5(title, subtitle, body, author, tokenize='unicode61 remove_diacritics 2')"
+        ))
+
+    def index_posts(self, connection, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        self.remove_posts(connection, post_ids)
+        rows = connection.execute(
+            select(BlogPost.id, BlogPost.title, BlogPost.subtitle, BlogPost.body, User.name)
+            .join(User, BlogPost.author_id == User.id)
+            .where(BlogPost.id.in_(post_ids))
+        )
+        self._insert(connection, rows)
+
+    def remove_posts(self, connection, post_ids):
+        post_ids = list(post_ids)
+        if post_ids:
+            connection.execute(
+                text("DELETE FROM post_search WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": post_ids},
+            )
+
+    def rebuild(self, connection):
+        connection.execute(text("DELETE FROM post_search"))
+        rows = connection.execute(
+            select(BlogPost.id, BlogPost.title, BlogPost.subtitle, BlogPost.body, User.name)
+            .join(User, BlogPost.author_id == User.id)
+            .execution_options(yield_per=500)
+        )
+        self._insert(connection, rows)
+
+    def _insert(self, connection, rows, batch_size=500):
+        insert = text("INSERT INTO post_search (rowid, title, subtitle, body, author) "
+                      "VALUES (:id, :title, :subtitle, :body, :author)")
+        batch = []
+        for row in rows:
+            batch.append({"id": row.id, "title": row.title, "subtitle": row.subtitle,
+                          "body": plain_text(row.body), "author": row.name})
+            if len(batch) == batch_size:
+                connection.execute(insert, batch)
+                batch = []
+        if batch:
+            connection.execute(insert, batch)
+
+    def search(self, query, offset, limit):
+        # Quote every word so user input can never be parsed as FTS5 syntax; the
+        # trailing * makes the last word a prefix match for search-as-you-type.
+        words = WORD.findall(query)
+        if not words:
+            return [], 0
+        match = " ".join(f'"{word}"' for word in words) + "*"
+        total = db.session.execute(text("SELECT count(*) FROM post_search WHERE post_search MATCH :match"),
+                                   {"match": match}).scalar()
+        ids = db.session.scalars(text(
+            f"SELECT rowid FROM post_search WHERE post_search MATCH :match "
+            f"ORDER BY bm25(post_search, {self.WEIGHTS}) LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit, "offset": offset}).all()
+        return ids, total
+
+
+class LikeBackend(SearchBackend):
+    # Portable fallback for databases without FTS5: no index to maintain, but every search scans the table
+    def index_posts(self, connection, post_ids):
+        pass
+
+    def remove_posts(self, connection, post_ids):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def search(self, query, offset, limit):
+        words = WORD.findall(query)
+        if not words:
+            return [], 0
+        matches = select(BlogPost.id).join(User, BlogPost.author_id == User.id)
+        for word in words:
+            pattern = f"%{word}%"
+            matches = matches.where(or_(BlogPost.title.ilike(pattern), BlogPost.subtitle.ilike(pattern),
+                                        BlogPost.body.ilike(pattern), User.name.ilike(pattern)))
+        total = db.session.execute(select(func.count()).select_from(matches.subquery())).scalar()
+        ids = db.session.scalars(matches.order_by(BlogPost.id.desc()).offset(offset).limit(limit)).all()
+        return ids, total
+
+
+BACKENDS = {
+    "fts5": SQLiteFTS5Backend,
+    "like": LikeBackend,
+}
+
+
+def search_backend():
+    extension = current_app.extensions.setdefault("search_backend", {})
+    if "backend" not in extension:
+        name = current_app.config.get("SEARCH_BACKEND")
+        if not name:
+            name = "fts5" if db.engine.dialect.name == "sqlite" else "like"
+        extension["backend"] = BACKENDS[name]()
+    return extension["backend"]
+
+
+def search_posts(query, page, per_page):
+    offset = (page - 1) * per_page
+    if not query:
+        posts = (BlogPost.query.options(*load_options("search"))
+                 .order_by(BlogPost.created_at.desc()).offset(offset).limit(per_page).all())
+        return posts, BlogPost.query.count()
+    ids, total = search_backend().search(query, offset, per_page)
+    posts = BlogPost.query.options(*load_options("search")).filter(BlogPost.id.in_(ids)).all() if ids else []
+    posts.sort(key=lambda post: ids.index(post.id))
+    return posts, total
+
+
+def rebuild_index():
+    connection = db.session.connection()
+    backend = search_backend()
+    backend.setup(connection)
+    backend.rebuild(connection)
+
+
+INDEXED = ("title", "subtitle", "body", "author_id")
+
+
+@event.listens_for(Session, "after_flush")
+def sync_search_index(session, flush_context):
+    changed, removed, renamed = set(), set(), set()
+    for obj in session.new | session.dirty:
+        if isinstance(obj, BlogPost):
+            state = inspect(obj)
+            if obj in session.new or any(state.attrs[key].history.has_changes() for key in INDEXED):
+                changed.add(obj.id)
+        elif isinstance(obj, User) and obj not in session.new and inspect(obj).attrs.name.history.has_changes():
+            renamed.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, BlogPost):
+            removed.add(obj.id)
+    if not (changed or removed or renamed):
+        return
+
+    connection = session.connection()
+    backend = search_backend()
+    if renamed:
+        changed.update(connection.scalars(select(BlogPost.id).where(BlogPost.author_id.in_(renamed))))
+    backend.remove_posts(connection, removed)
+    backend.index_posts(connection, changed - removed)
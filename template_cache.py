@@ -0,0 +1,24 @@
+import os
+from jinja2 import FileSystemBytecodeCache
+
+
+def install_bytecode_cache(app):
+    # Compiled templates are shared by every worker through this directory. Entries are keyed
+    # by the template source's checksum, so an edited template is recompiled, never served stale.
+    directory = app.config.get("JINJA_CACHE_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def template_names(environment):
+    # Skips stray non-template files (.DS_Store and the like) in template folders
+    return environment.list_templates(extensions=["html", "txt", "xml"])
+
+
+def compile_templates(environment):
+    # Loads every template the app and its extensions can render: from the bytecode cache
+    # when it has them, otherwise compiled from source and written to it
+    for name in template_names(environment):
+        environment.get_template(name)
+        yield name
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from werkzeug.utils import import_string
+from database import db
+from models import User
+
+
+class UserCache:
+    # Column snapshots of recently seen users, so the per-request user_loader
+    # lookup becomes a dict hit. Any change to a user row drops its snapshot
+    # once the change commits; `broadcast`, when configured, is called with the
+    # same ids so other workers can drop theirs via invalidate(..., broadcast=False).
+    def __init__(self, ttl=60, max_entries=10000, broadcast=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.broadcast = broadcast
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation = 0
+
+    def load(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+                generation = self.generation
+        if entry is not None:
+            return self.attach(entry[1])
+        columns = inspect(User).column_attrs
+        loaded = db.session.identity_map.get(identity_key(User, user_id))
+        if loaded is not None and not inspect(loaded).unloaded.intersection(columns.keys()):
+            # Already on this page (e.g. as a post's author): no SELECT needed
+            snapshot = {key: getattr(loaded, key) for key in columns.keys()}
+        else:
+            # A partly loaded user (a liker loaded with load_only) would lazy-load the missing
+            # columns one by one, so those are read in one explicit SELECT instead
+            row = db.session.execute(select(*(column.class_attribute for column in columns)).where(User.id == user_id)).first()
+            if row is None:
+                return None
+            snapshot = dict(zip(columns.keys(), row))
+        with self.lock:
+            if generation == self.generation:
+                self.entries[user_id] = (now + self.ttl, snapshot)
+                self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            # Otherwise something was invalidated while we read and this row may predate it: not cached
+        return self.attach(snapshot)
+
+    def attach(self, snapshot):
+        # Rebuild the row as a clean persistent object without a SELECT
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_ids, broadcast=True):
+        user_ids = set(user_ids)
+        with self.lock:
+            self.generation += 1
+            for user_id in user_ids:
+                if self.entries.pop(user_id, None) is not None:
+                    self.invalidations += 1
+        if broadcast and self.broadcast and user_ids:
+            self.broadcast(user_ids)
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "entries": len(self.entries), "hit_rate": self.hits / total if total else 0.0}
+
+
+def user_cache():
+    extension = current_app.extensions
+    if "user_cache" not in extension:
+        config = current_app.config
+        broadcast = config.get("USER_CACHE_BROADCAST")
+        extension["user_cache"] = UserCache(
+            ttl=config.get("USER_CACHE_TTL", 60),
+            max_entries=config.get("USER_CACHE_SIZE", 10000),
+            broadcast=import_string(broadcast) if broadcast else None,
+        )
+    return extension["user_cache"]
+
+
+def forget_user(user_id):
+    # For changes made with bulk UPDATEs, which the flush hook below cannot see
+    db.session.info.setdefault("changed_users", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in session.dirty | session.deleted if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault("changed_users", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def drop_changed_users(session):
+    changed = session.info.pop("changed_users", None)
+    if changed:
+        user_cache().invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changed_users(session):
+    session.info.pop("changed_users", None)
@@ -0,0 +1,21 @@
+from flask_login import current_user
+from sqlalchemy import select
+from database import db
+from models import Likes
+
+
+def liked_ids(column, ids):
+    ids = set(ids)
+    if not ids or not current_user.is_authenticated:
+        return set()
+    return set(db.session.scalars(
+        select(column).where(Likes.author_id == current_user.id, column.in_(ids))
+    ))
+
+
+def viewer_state(posts=(), comments=()):
+    # One query per kind for the whole page instead of scanning current_user.likes per card
+    return {
+        "liked_posts": liked_ids(Likes.post_id, [post.id for post in posts]),
+        "liked_comments": liked_ids(Likes.comment_id, [comment.id for comment in comments]),
+    }